@@ -10,6 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import importlib.util
+import os
+import tempfile
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,15 +43,21 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     
     'rest_framework',
-    'rest_framework_swagger',
-    'drf_yasg',
 
     'website'
 ]
 
+# drf_yasg isn't an installed app, so that it's only imported when the API
+# docs are requested (website/schema.py), its templates and static files are
+# added to the TEMPLATES DIRS and STATICFILES_DIRS
+DRF_YASG_DIR = Path(importlib.util.find_spec('drf_yasg').origin).parent
+
 CSRF_TRUSTED_ORIGINS = ['http://127.0.0.1:8000']
 
 MIDDLEWARE = [
+    'website.middleware.InstrumentationMiddleware',
+    'website.middleware.ProfilingMiddleware',
+    'website.middleware.ReplicaMiddleware',
     'website.middleware.DisableCSRF',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -64,7 +74,7 @@ ROOT_URLCONF = 'pet_meet.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [DRF_YASG_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -91,17 +101,50 @@ DATABASES = {
     }
 }
 """
+# Connections are kept open for DATABASE_CONN_MAX_AGE seconds (0 closes them
+# at the end of each request) and checked before their first use in a
+# request. Their statistics are at database/stats/ (website/database.py).
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': 'pet_meet', 
-        'USER': 'postgres',
-        'PASSWORD': 'test',
-        'HOST': 'winhost', #'172.28.176.1', 
-        'PORT': '5432'
+        'NAME': os.environ.get('DATABASE_NAME', 'pet_meet'),
+        'USER': os.environ.get('DATABASE_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DATABASE_PASSWORD', 'test'),
+        'HOST': os.environ.get('DATABASE_HOST', 'winhost'), #'172.28.176.1', 
+        'PORT': os.environ.get('DATABASE_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DATABASE_CONN_HEALTH_CHECKS', '1') == '1',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DATABASE_CONNECT_TIMEOUT', 5))
+        }
     }
 }
 
+# Read replicas (website/replicas.py): DATABASE_REPLICA_HOSTS is a comma
+# separated list of `host[:port]` of copies of the default database, or of
+# file names when it is SQLite. GET requests read from them.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), 1):
+    alias = f'replica{number}'
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+        location = {'NAME': replica.strip()}
+    else:
+        host, _, port = replica.strip().partition(':')
+        location = {'HOST': host, 'PORT': port or DATABASES['default']['PORT']}
+    DATABASES[alias] = {**DATABASES['default'], **location, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['website.replicas.ReplicaRouter']
+
+# Users read from the primary for REPLICA_STICKY_SECONDS after writing. A
+# replica that is down, or lags more than REPLICA_MAX_LAG seconds (checked at
+# most every REPLICA_CHECK_INTERVAL seconds), is skipped for
+# REPLICA_EJECT_SECONDS.
+REPLICA_STICKY_SECONDS = 5
+REPLICA_MAX_LAG = 5
+REPLICA_CHECK_INTERVAL = 10
+REPLICA_EJECT_SECONDS = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -140,6 +183,7 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATICFILES_DIRS = [DRF_YASG_DIR / 'static']
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -147,14 +191,127 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Use a cache shared between processes (file-based, memcached, redis) when
+# running several workers, the response cache relies on it for invalidation.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000
+        }
+    }
+}
+
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300  # seconds
+
+
+# meetings/upcoming/ serves the meetings of the next DISCOVERY_WINDOW of a
+# city from a cache entry kept for DISCOVERY_CACHE_TIMEOUT seconds
+DISCOVERY_WINDOW = timedelta(days=7)
+DISCOVERY_CACHE_TIMEOUT = 600
+
+# Rows fetched at a time by the streaming group export
+EXPORT_CHUNK_SIZE = 2000
+
+# Largest number of items accepted by the batch create endpoints
+BATCH_MAX_SIZE = 100
+
+# feed/ (website/feed.py): feeds keep about their FEED_MAX_LENGTH newest
+# entries, trimmed after one in FEED_TRIM_INTERVAL fan-outs on average. The
+# posts and meetings of groups with more than FEED_FANOUT_LIMIT participants
+# are read from the groups instead of being copied into every feed. A request
+# inserts at most FEED_FANOUT_MAX_ENTRIES entries when it commits and leaves
+# the rest to a background thread.
+FEED_MAX_LENGTH = 500
+FEED_TRIM_INTERVAL = 50
+FEED_FANOUT_LIMIT = 1000
+FEED_FANOUT_MAX_ENTRIES = 5000
+
+# List endpoints serialize `.values()` rows instead of model instances when
+# their serializer allows it (see website/values.py)
+VALUES_SERIALIZATION = True
+
+# Number of recent requests per URL pattern the instrumentation percentiles
+# are computed from
+INSTRUMENTATION_SAMPLE_SIZE = 1000
+
+# Sampling profiler (website/profiling.py), off unless enabled.
+# PROFILER_RATE: profile one in N requests, 0 to only profile requests with
+# an `X-Profile` header made by the `profile_token` command
+PROFILER_ENABLED = False
+PROFILER_RATE = 1000
+PROFILER_INTERVAL = 0.001  # seconds between samples
+PROFILER_DIRECTORY = BASE_DIR / 'profiles'
+PROFILER_TOKEN_MAX_AGE = 24 * 60 * 60  # seconds
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'website.middleware': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        # the measurements of every request, REQUEST_LOG_LEVEL=INFO to see them
+        'website.requests': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'website.authentication.TokenUserAuthentication',
     ),
     'USER_ID_FIELD': 'email',
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'website.throttling.UserTokenBucketThrottle',
+        'website.throttling.IPTokenBucketThrottle',
+    ),
+    # bursts of up to N tokens, refilled at N per period (website/throttling.py)
+    'DEFAULT_THROTTLE_RATES': {
+        'user': '600/min',
+        'ip': '3000/min',
+    },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 25
-}
\ No newline at end of file
+}
+
+# API docs (website/schema.py): the schema written by `generate_schema` to
+# SCHEMA_FILE is served, unless DEBUG is set, and cached by clients for
+# SCHEMA_CACHE_TIMEOUT seconds
+SCHEMA_FILE = BASE_DIR / 'website' / 'openapi.json'
+SCHEMA_CACHE_TIMEOUT = 60 * 60
+SWAGGER_SETTINGS = {'SPEC_URL': 'schema-file'}
+REDOC_SETTINGS = {'SPEC_URL': 'schema-file'}
+
+# Throttling buckets are shared by the worker processes of a host through
+# THROTTLE_FILE, which holds THROTTLE_SLOTS buckets (24 bytes each)
+THROTTLE_ENABLED = True
+THROTTLE_FILE = Path('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()) / 'pet_meet-throttle'
+THROTTLE_SLOTS = 65536
+# Access tokens carry the user fields views need (website/authentication.py)
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'website.authentication.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'website.authentication.TokenRefreshSerializer',
+}
+
+# Rows of token users read in the last TOKEN_USER_CACHE_TIMEOUT seconds are
+# kept in process, for fields the token doesn't carry
+TOKEN_USER_CACHE_TIMEOUT = 30
+TOKEN_USER_CACHE_MAX_ENTRIES = 10000
@@ -0,0 +1,235 @@
+"""
+Async variants of the read endpoints, served under /async/.
+
+Under ASGI a sync view holds a worker thread for the whole request. These
+views await the async ORM and the async cache API instead, so the event loop
+keeps serving other requests while theirs wait. Responses (data, pagination,
+field selection, ETags and the response cache) are the same as the ones of
+the matching sync views in website/views.py, whose mixins they share.
+
+Django's database backends are still sync: each ORM call runs in a thread of
+the request (`sync_to_async`), and so do DRF's authentication classes and
+page number pagination. Prefetches are run in that thread together with the
+query they belong to.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework.exceptions import (
+    APIException, AuthenticationFailed, NotAuthenticated, NotFound, PermissionDenied, Throttled
+)
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import cache, values
+from .conditional import aconditional
+from .models import User, Meeting, Group, Post, Comment, Animal
+from .pagination import KeysetPagination
+from .serializers import (
+    AnimalDetailSerializer, AnimalIndexSerializer,
+    CommentDetailSerializer, CommentIndexSerializer,
+    GroupDetailSerializer, GroupIndexSerializer,
+    MeetingDetailSerializer, MeetingIndexSerializer,
+    PostDetailSerializer, PostIndexSerializer
+)
+from .views import (
+    AnimalDetailViewMixin, AnimalIndexViewMixin,
+    CommentDetailViewMixin, CommentIndexViewMixin,
+    GroupDetailViewMixin, GroupIndexViewMixin,
+    MeetingDetailViewMixin, MeetingIndexViewMixin,
+    PostDetailViewMixin, PostIndexViewMixin,
+    get_selection
+)
+
+
+def render(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+
+async def afind_or_404(model, pk, serializer_class=None, **selection):
+    queryset = model.objects.filter(id=pk)
+    if serializer_class is not None:
+        queryset = serializer_class.setup_eager_loading(queryset, **selection)
+
+    record = await queryset.afirst()
+    if record is None:
+        raise Http404
+
+    return record
+
+
+async def apaginate(request, queryset, serializer_class, paginator_class=PageNumberPagination):
+    """
+    `views.paginate` for async views. Paginators without an
+    `apaginate_queryset` (DRF's page numbers) read the page in a thread.
+    """
+    paginator = paginator_class()
+    selection = get_selection(request, serializer_class)
+    ordering = [name.lstrip('-') for name in getattr(paginator, 'ordering', ())]
+    mapper = values.get_mapper(serializer_class, **selection) if settings.VALUES_SERIALIZATION else None
+    if mapper is not None:
+        queryset = mapper.select(queryset, *ordering)
+    else:
+        queryset = serializer_class.setup_eager_loading(queryset, **selection, extra_columns=ordering)
+
+    if hasattr(paginator, 'apaginate_queryset'):
+        page = await paginator.apaginate_queryset(queryset, request=request)
+    else:
+        page = await sync_to_async(paginator.paginate_queryset)(queryset, request=request)
+
+    data = mapper.many(page) if mapper is not None else serializer_class(page, many=True, **selection).data
+    return render(paginator.get_paginated_response(data).data)
+
+
+class AsyncAPIView(View):
+    """
+    Authenticates, checks the permissions of and throttles requests with the
+    view's authentication, permission and throttle classes (by default the
+    REST_FRAMEWORK ones) and answers API errors the way DRF views do.
+    """
+    queryset = None
+    serializer_class = None
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        self.request = request
+        try:
+            await sync_to_async(self.check_permissions)(request)
+            # the token buckets are in memory, no need for a thread
+            self.check_throttles(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except Http404:
+            return self.handle_exception(request, NotFound())
+        except APIException as exception:
+            return self.handle_exception(request, exception)
+
+    def get_queryset(self):
+        return self.queryset.all()
+
+    def check_permissions(self, request):
+        # as APIView.initial: authentication errors first, then each permission
+        request.user
+        for permission in [permission_class() for permission_class in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if request.authenticators and not request.successful_authenticator:
+                    raise NotAuthenticated
+                raise PermissionDenied(getattr(permission, 'message', None), getattr(permission, 'code', None))
+
+    def check_throttles(self, request):
+        throttles = [throttle_class() for throttle_class in self.throttle_classes]
+        waits = [throttle.wait() for throttle in throttles if not throttle.allow_request(request, self)]
+        if waits:
+            raise Throttled(max([wait for wait in waits if wait is not None], default=None))
+
+    def handle_exception(self, request, exception):
+        auth_header = None
+        if isinstance(exception, (NotAuthenticated, AuthenticationFailed)):
+            authenticator = request.authenticators[0] if request.authenticators else None
+            auth_header = getattr(authenticator, 'authenticate_header', lambda request: None)(request)
+            if auth_header is None:
+                exception.status_code = 403
+
+        detail = exception.detail if isinstance(exception.detail, (list, dict)) else {'detail': exception.detail}
+        response = render(detail, exception.status_code)
+        if auth_header is not None:
+            response['WWW-Authenticate'] = auth_header
+        if isinstance(exception, Throttled) and exception.wait is not None:
+            response['Retry-After'] = str(exception.wait)
+
+        return response
+
+
+class GroupIndexAPIView(GroupIndexViewMixin, AsyncAPIView):
+    @aconditional
+    async def get(self, request):
+        return await apaginate(request, self.get_queryset(), GroupIndexSerializer)
+
+
+class GroupDetailAPIView(GroupDetailViewMixin, AsyncAPIView):
+    @aconditional
+    async def get(self, request, group_id):
+        selection = get_selection(request, GroupDetailSerializer)
+
+        async def build():
+            group = await afind_or_404(Group, group_id, GroupDetailSerializer, **selection)
+            return GroupDetailSerializer(group, **selection).data
+
+        data = await cache.aget_or_build(
+            Group, group_id, GroupDetailSerializer, build,
+            **selection
+        )
+        return render(data)
+
+
+class PostIndexAPIView(PostIndexViewMixin, AsyncAPIView):
+    @aconditional
+    async def get(self, request, group_id):
+        await afind_or_404(Group, group_id)
+        return await apaginate(request, self.get_queryset(), PostIndexSerializer, KeysetPagination)
+
+
+class PostDetailAPIView(PostDetailViewMixin, AsyncAPIView):
+    @aconditional
+    async def get(self, request, pk):
+        selection = get_selection(request, PostDetailSerializer)
+
+        async def build():
+            post = await afind_or_404(Post, pk, PostDetailSerializer, **selection)
+            return PostDetailSerializer(post, **selection).data
+
+        data = await cache.aget_or_build(
+            Post, pk, PostDetailSerializer, build,
+            **selection
+        )
+        return render(data)
+
+
+class MeetingIndexAPIView(MeetingIndexViewMixin, AsyncAPIView):
+    @aconditional
+    async def get(self, request, group_id):
+        await afind_or_404(Group, group_id)
+        return await apaginate(request, self.get_queryset(), MeetingIndexSerializer, KeysetPagination)
+
+
+class MeetingDetailAPIView(MeetingDetailViewMixin, AsyncAPIView):
+    @aconditional
+    async def get(self, request, pk):
+        selection = get_selection(request, MeetingDetailSerializer)
+        meeting = await afind_or_404(Meeting, pk, MeetingDetailSerializer, **selection)
+        return render(MeetingDetailSerializer(meeting, **selection).data)
+
+
+class CommentIndexAPIView(CommentIndexViewMixin, AsyncAPIView):
+    @aconditional
+    async def get(self, request, post_id):
+        await afind_or_404(Post, post_id)
+        return await apaginate(request, self.get_queryset(), CommentIndexSerializer, KeysetPagination)
+
+
+class CommentDetailAPIView(CommentDetailViewMixin, AsyncAPIView):
+    @aconditional(last_modified=True)
+    async def get(self, request, pk):
+        selection = get_selection(request, CommentDetailSerializer)
+        comment = await afind_or_404(Comment, pk, CommentDetailSerializer, **selection)
+        return render(CommentDetailSerializer(comment, **selection).data)
+
+
+class AnimalIndexAPIView(AnimalIndexViewMixin, AsyncAPIView):
+    @aconditional
+    async def get(self, request, user_id):
+        await afind_or_404(User, user_id)
+        return await apaginate(request, self.get_queryset(), AnimalIndexSerializer, KeysetPagination)
+
+
+class AnimalDetailAPIView(AnimalDetailViewMixin, AsyncAPIView):
+    @aconditional(last_modified=True)
+    async def get(self, request, pk):
+        selection = get_selection(request, AnimalDetailSerializer)
+        animal = await afind_or_404(Animal, pk, AnimalDetailSerializer, **selection)
+        return render(AnimalDetailSerializer(animal, **selection).data)
@@ -0,0 +1,79 @@
+"""
+Attending and unattending meetings, with `Meeting.attendee_count` only
+changed when an attendees row was written.
+"""
+from django.db import connection, transaction
+from django.db.utils import IntegrityError
+
+from .models import Meeting
+
+
+ATTENDEES = Meeting.attendees.through
+
+
+def _tables():
+    return (
+        connection.ops.quote_name(Meeting._meta.db_table),
+        connection.ops.quote_name(ATTENDEES._meta.db_table)
+    )
+
+
+def _attendee_count(cursor, meeting_id):
+    meetings, _ = _tables()
+    cursor.execute(f'SELECT attendee_count FROM {meetings} WHERE id = %s', [meeting_id])
+    row = cursor.fetchone()
+    return None if row is None else row[0]
+
+
+def _change(cursor, change_sql, change_params, meeting_id, change):
+    """
+    Runs `change_sql` (which writes at most one attendees row) and updates the
+    counter when it did. Returns (changed, attendee_count), or None when the
+    meeting doesn't exist.
+    """
+    meetings, _ = _tables()
+    # a count that drifted to 0 (attendees added in the admin) stays at 0
+    update_sql = (
+        f'UPDATE {meetings} SET attendee_count = CASE WHEN attendee_count + %s > 0 THEN attendee_count + %s ELSE 0 END '
+        f'WHERE id = %s'
+    )
+    if connection.vendor == 'postgresql':
+        cursor.execute(
+            f'WITH changed AS ({change_sql} RETURNING 1) '
+            f'{update_sql} AND EXISTS (SELECT 1 FROM changed) RETURNING attendee_count',
+            [*change_params, change, change, meeting_id]
+        )
+        row = cursor.fetchone()
+        if row is not None:
+            return True, row[0]
+    else:
+        with transaction.atomic():
+            cursor.execute(change_sql, change_params)
+            if cursor.rowcount:
+                cursor.execute(update_sql, [change, change, meeting_id])
+                return True, _attendee_count(cursor, meeting_id)
+
+    count = _attendee_count(cursor, meeting_id)
+    return None if count is None else (False, count)
+
+
+def attend(meeting_id, user_id):
+    meetings, attendees = _tables()
+    insert_sql = (
+        f'INSERT INTO {attendees} (meeting_id, user_id) '
+        f'SELECT %s, %s WHERE EXISTS (SELECT 1 FROM {meetings} WHERE id = %s) '
+        f'ON CONFLICT DO NOTHING'
+    )
+    with connection.cursor() as cursor:
+        try:
+            return _change(cursor, insert_sql, [meeting_id, user_id, meeting_id], meeting_id, 1)
+        except IntegrityError:
+            # the meeting was deleted between the check and the insert
+            return None
+
+
+def unattend(meeting_id, user_id):
+    _, attendees = _tables()
+    delete_sql = f'DELETE FROM {attendees} WHERE meeting_id = %s AND user_id = %s'
+    with connection.cursor() as cursor:
+        return _change(cursor, delete_sql, [meeting_id, user_id], meeting_id, -1)
@@ -0,0 +1,107 @@
+"""
+Token users: `request.user` built from access token claims and a short lived
+in-process cache of user rows, without a user query per request.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt import serializers
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User, TokenUser
+
+
+CLAIMS = ('email', 'first_name', 'last_name', 'address_city')
+# read from the user row on each request, as they may be revoked before the token expires
+PRIVILEGES = ('is_superuser',)
+
+# user id: (expiry, field values by attname)
+_users = OrderedDict()
+_users_lock = threading.Lock()
+
+
+def get_user_values(pk):
+    """
+    The field values of user `pk` by attname, None when there is no such user.
+    """
+    now = time.monotonic()
+    with _users_lock:
+        entry = _users.get(pk)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    attnames = [field.attname for field in User._meta.concrete_fields]
+    values = User.objects.filter(pk=pk).values(*attnames).first()
+    if values is None:
+        return None
+
+    with _users_lock:
+        _users[pk] = (now + settings.TOKEN_USER_CACHE_TIMEOUT, values)
+        _users.move_to_end(pk)
+        while len(_users) > settings.TOKEN_USER_CACHE_MAX_ENTRIES:
+            _users.popitem(last=False)
+
+    return values
+
+
+def forget_user(pk):
+    with _users_lock:
+        _users.pop(pk, None)
+
+
+def add_claims(token, values):
+    for name in CLAIMS:
+        token[name] = values[name]
+
+
+class TokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # copied to the access tokens made from the refresh token
+        add_claims(token, {name: getattr(user, name) for name in CLAIMS})
+        return token
+
+
+class ClaimsRefreshToken(RefreshToken):
+    @property
+    def access_token(self):
+        access = super().access_token
+        values = get_user_values(self[api_settings.USER_ID_CLAIM])
+        if values is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+
+        add_claims(access, values)
+        return access
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class TokenUserAuthentication(JWTAuthentication):
+    """
+    `JWTAuthentication` returning a `TokenUser` built from the token's
+    claims and the user's cached privileges. Tokens issued without the
+    claims still load the user.
+    """
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token or \
+                any(name not in validated_token for name in CLAIMS):
+            return super().get_user(validated_token)
+
+        pk = validated_token[api_settings.USER_ID_CLAIM]
+        values = get_user_values(pk)
+        if values is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+
+        claims = {'id': pk}
+        claims.update((name, validated_token[name]) for name in CLAIMS)
+        claims.update((name, values[name]) for name in PRIVILEGES)
+        field_names = [field.attname for field in TokenUser._meta.concrete_fields if field.attname in claims]
+        return TokenUser.from_db(None, field_names, [claims[name] for name in field_names])
@@ -0,0 +1,160 @@
+"""
+Read-through cache of detail responses. Each entry records the versions of
+the objects it embeds, and writes bump those versions (see website/signals.py).
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import replicas
+
+
+# bumped by `invalidate_all()`, every response depends on it
+ALL_VERSION_KEY = 'response:version:all'
+
+# hits: responses served from the cache
+# misses: responses without an entry (never built, expired or evicted)
+# stale: entries built before one of their objects changed, rebuilt
+# invalidations: version bumps
+stats = Counter(hits=0, misses=0, stale=0, invalidations=0)
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _count(name):
+    with _stats_lock:
+        stats[name] += 1
+
+
+def get_stats():
+    with _stats_lock:
+        return dict(stats)
+
+
+def _version_key(model, pk):
+    return f'response:version:{model._meta.label_lower}:{pk}'
+
+
+def _start_version(cache, key):
+    # a fresh starting point, so entries stored under an evicted version can't match it
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+async def _astart_version(cache, key):
+    await cache.aadd(key, time.time_ns(), timeout=None)
+    return await cache.aget(key)
+
+
+def get_all_version():
+    cache = get_cache()
+    version = cache.get(ALL_VERSION_KEY)
+    return _start_version(cache, ALL_VERSION_KEY) if version is None else version
+
+
+def _selection_key(fields, expand):
+    if fields is None and not expand:
+        return ''
+
+    return f'[{",".join(fields or ("*",))}+{",".join(expand)}]'
+
+
+def _get_keys(model, pk, serializer_class, dependencies, fields, expand):
+    key = f'response:{model._meta.label_lower}:{pk}:{serializer_class.__name__}{_selection_key(fields, expand)}'
+    version_keys = [ALL_VERSION_KEY, _version_key(model, pk)] + [_version_key(*dependency) for dependency in dependencies]
+    return key, version_keys
+
+
+def _lookup(entry, versions):
+    if entry is None:
+        _count('misses')
+        return None
+
+    entry_versions, data = entry
+    if entry_versions != versions:
+        _count('stale')
+        return None
+
+    _count('hits')
+    return data
+
+
+def get_or_build(model, pk, serializer_class, build, dependencies=(), fields=None, expand=()):
+    """
+    Returns the cached response data for the object, calling `build()` to
+    produce (and store) it on a miss. `dependencies` are (model, pk) pairs of
+    other objects the response embeds, `fields` and `expand` the field
+    selection the response is built with.
+    """
+    cache = get_cache()
+    key, version_keys = _get_keys(model, pk, serializer_class, dependencies, fields, expand)
+    # one round trip for the entry and the versions it must match
+    values = cache.get_many([key, *version_keys])
+    versions = [
+        values[version_key] if version_key in values else _start_version(cache, version_key)
+        for version_key in version_keys
+    ]
+    data = _lookup(values.get(key), versions)
+    if data is None:
+        # a copy from a lagging replica would outlive its lag
+        with replicas.primary():
+            data = build()
+        # the versions read before building, so a write made meanwhile makes the entry stale
+        cache.set(key, (versions, data), timeout=settings.RESPONSE_CACHE_TIMEOUT)
+
+    return data
+
+
+async def aget_or_build(model, pk, serializer_class, build, dependencies=(), fields=None, expand=()):
+    """
+    `get_or_build` for async views, `build()` returns an awaitable.
+    """
+    cache = get_cache()
+    key, version_keys = _get_keys(model, pk, serializer_class, dependencies, fields, expand)
+    values = await cache.aget_many([key, *version_keys])
+    versions = [
+        values[version_key] if version_key in values else await _astart_version(cache, version_key)
+        for version_key in version_keys
+    ]
+    data = _lookup(values.get(key), versions)
+    if data is None:
+        with replicas.primary():
+            data = await build()
+        await cache.aset(key, (versions, data), timeout=settings.RESPONSE_CACHE_TIMEOUT)
+
+    return data
+
+
+def _bump(keys):
+    cache = get_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+        _count('invalidations')
+
+
+def invalidate(*objects):
+    """
+    Makes cached responses embedding the given (model, pk) pairs stale once
+    the current transaction commits, so a concurrent request can't cache data
+    read before the commit under the new version.
+    """
+    keys = list(dict.fromkeys(_version_key(model, pk) for model, pk in objects if pk is not None))
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def invalidate_all():
+    """
+    Makes every cached response stale, for writes that send no signals
+    (bulk inserts).
+    """
+    transaction.on_commit(lambda: _bump([ALL_VERSION_KEY]))
@@ -0,0 +1,123 @@
+"""
+Conditional GET support: views describe the rows a response is built from in
+`get_state()`, as `state()`s, and matching If-None-Match requests get a 304.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, F, Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def _get_aggregates(queryset, relations):
+    aggregates = {'count': Count('pk'), 'last_id': Max('pk')}
+    field_names = {field.name for field in queryset.model._meta.get_fields()}
+    if 'updated_at' in field_names:
+        aggregates['updated_at'] = Max('updated_at')
+
+    for relation in relations:
+        aggregates[f'{relation}_updated_at'] = Max(f'{relation}__updated_at')
+
+    # counters are written with .update() or raw SQL, which leave updated_at alone;
+    # the sum weighted by id also changes when one counter goes up and another down
+    for name in getattr(queryset.model, 'counter_fields', ()):
+        aggregates[f'{name}_sum'] = Sum(name)
+        aggregates[f'{name}_by_id'] = Sum(F(name) * F('pk'))
+
+    return aggregates
+
+
+def state(queryset, *relations):
+    """
+    The rows of `queryset` and the `relations` (foreign key paths) they
+    embed, summarized by `conditional` with one aggregate query.
+    """
+    return queryset, relations
+
+
+def summarize(states):
+    return [
+        queryset.order_by().aggregate(**_get_aggregates(queryset, relations))
+        for queryset, relations in states
+    ]
+
+
+async def asummarize(states):
+    return [
+        await queryset.order_by().aaggregate(**_get_aggregates(queryset, relations))
+        for queryset, relations in states
+    ]
+
+
+def get_last_modified(states):
+    timestamps = [
+        value for summary in states for key, value in summary.items()
+        if key.endswith('updated_at') and value is not None
+    ]
+    return max(timestamps) if timestamps else None
+
+
+def get_etag(request, states):
+    # the query string selects the page, so it is part of the version
+    version = repr([request.get_full_path()] + [sorted(summary.items()) for summary in states])
+    return '"%s"' % hashlib.md5(version.encode()).hexdigest()
+
+
+def get_validators(request, states, last_modified):
+    last_modified = get_last_modified(states) if last_modified else None
+    return get_etag(request, states), int(last_modified.timestamp()) if last_modified else None
+
+
+def set_validators(response, etag, timestamp):
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+
+    return response
+
+
+def conditional(get=None, *, last_modified=False):
+    """
+    Adds an ETag header to the responses of a `get` handler and answers
+    matching If-None-Match requests with a 304.
+
+    With `last_modified`, also Last-Modified and If-Modified-Since. Only for
+    responses of a single row and its foreign keys: deleting a row of a
+    collection can move its latest updated_at back.
+    """
+    def decorator(get):
+        @wraps(get)
+        def wrapper(self, request, *args, **kwargs):
+            summaries = summarize(self.get_state(request, **kwargs))
+            etag, timestamp = get_validators(request, summaries, last_modified)
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = get(self, request, *args, **kwargs)
+
+            return set_validators(response, etag, timestamp)
+
+        return wrapper
+
+    return decorator if get is None else decorator(get)
+
+
+def aconditional(get=None, *, last_modified=False):
+    """
+    `conditional` for async `get` handlers.
+    """
+    def decorator(get):
+        @wraps(get)
+        async def wrapper(self, request, *args, **kwargs):
+            summaries = await asummarize(self.get_state(request, **kwargs))
+            etag, timestamp = get_validators(request, summaries, last_modified)
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = await get(self, request, *args, **kwargs)
+
+            return set_validators(response, etag, timestamp)
+
+        return wrapper
+
+    return decorator if get is None else decorator(get)
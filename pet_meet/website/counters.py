@@ -0,0 +1,89 @@
+"""
+Denormalized counters on `Group` and `Meeting`, updated by the views and
+repaired by the `repair_counters` command.
+"""
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Meeting, Group, Post
+
+
+def _is_upcoming(time):
+    # the views assign `time` straight from the request data
+    time = Meeting._meta.get_field('time').to_python(time)
+    if timezone.is_naive(time):
+        # saved in the default time zone, see DateTimeField.get_prep_value
+        time = timezone.make_aware(time, timezone.get_default_timezone())
+
+    return time > timezone.now()
+
+
+def _decrement(name):
+    # a counter that drifted to 0 (rows created in the admin) stays at 0
+    return Greatest(F(name) - 1, 0)
+
+
+def post_created(post):
+    Group.objects.filter(pk=post.group_id).update(post_count=F('post_count') + 1)
+
+
+def posts_created(posts):
+    """
+    Counts bulk created posts, one UPDATE per group.
+    """
+    for group_id, count in Counter(post.group_id for post in posts).items():
+        Group.objects.filter(pk=group_id).update(post_count=F('post_count') + count)
+
+
+def post_deleted(post):
+    Group.objects.filter(pk=post.group_id).update(post_count=_decrement('post_count'))
+
+
+def meeting_created(meeting):
+    counts = {'meeting_count': F('meeting_count') + 1}
+    if _is_upcoming(meeting.time):
+        counts['upcoming_meeting_count'] = F('upcoming_meeting_count') + 1
+
+    Group.objects.filter(pk=meeting.group_id).update(**counts)
+
+
+def meeting_deleted(meeting):
+    counts = {'meeting_count': _decrement('meeting_count')}
+    if _is_upcoming(meeting.time):
+        counts['upcoming_meeting_count'] = _decrement('upcoming_meeting_count')
+
+    Group.objects.filter(pk=meeting.group_id).update(**counts)
+
+
+def meeting_rescheduled(meeting, old_time):
+    was_upcoming = _is_upcoming(old_time)
+    is_upcoming = _is_upcoming(meeting.time)
+    if was_upcoming != is_upcoming:
+        count = F('upcoming_meeting_count') + 1 if is_upcoming else _decrement('upcoming_meeting_count')
+        Group.objects.filter(pk=meeting.group_id).update(upcoming_meeting_count=count)
+
+
+def _count(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('pk')).values('count')
+        ),
+        0
+    )
+
+
+def recompute_counters():
+    """
+    Recomputes every counter from the underlying rows, one UPDATE per table.
+    """
+    Meeting.objects.update(
+        attendee_count=_count(Meeting.attendees.through.objects.all(), 'meeting_id')
+    )
+    Group.objects.update(
+        post_count=_count(Post.objects.all(), 'group_id'),
+        meeting_count=_count(Meeting.objects.all(), 'group_id'),
+        upcoming_meeting_count=_count(Meeting.objects.filter(time__gt=timezone.now()), 'group_id')
+    )
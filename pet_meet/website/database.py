@@ -0,0 +1,69 @@
+"""
+Per-process statistics of the database connections Django keeps per thread.
+"""
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+# connection: id of the thread using it
+_connections = weakref.WeakKeyDictionary()
+# ids of the threads handling a request
+_busy = set()
+# alias: {'opened': ..., 'connect_time': ..., 'max_connect_time': ...}
+_opened = {}
+_lock = threading.Lock()
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    # connect() sets close_at to CONN_MAX_AGE seconds from when it started
+    max_age = connection.settings_dict['CONN_MAX_AGE']
+    connect_time = time.monotonic() - (connection.close_at - max_age) if connection.close_at is not None else 0.0
+    with _lock:
+        _connections[connection] = threading.get_ident()
+        counts = _opened.setdefault(connection.alias, {'opened': 0, 'connect_time': 0.0, 'max_connect_time': 0.0})
+        counts['opened'] += 1
+        counts['connect_time'] += connect_time
+        counts['max_connect_time'] = max(counts['max_connect_time'], connect_time)
+
+
+@receiver(request_started)
+def request_began(**kwargs):
+    with _lock:
+        _busy.add(threading.get_ident())
+
+
+@receiver(request_finished)
+def request_ended(**kwargs):
+    with _lock:
+        _busy.discard(threading.get_ident())
+
+
+def get_stats():
+    with _lock:
+        connections = [(connection, thread in _busy) for connection, thread in _connections.items()]
+        opened = {alias: dict(counts) for alias, counts in _opened.items()}
+
+    stats = {}
+    for alias, settings_dict in settings.DATABASES.items():
+        open_connections = [busy for connection, busy in connections if connection.alias == alias and connection.connection is not None]
+        counts = opened.get(alias, {'opened': 0, 'connect_time': 0.0, 'max_connect_time': 0.0})
+        stats[alias] = {
+            'open': len(open_connections),
+            'in_use': sum(open_connections),
+            'idle': len(open_connections) - sum(open_connections),
+            'opened': counts['opened'],
+            'closed': counts['opened'] - len(open_connections),
+            'connect_ms_avg': round(counts['connect_time'] * 1000 / counts['opened'], 2) if counts['opened'] else None,
+            'connect_ms_max': round(counts['max_connect_time'] * 1000, 2),
+            'max_age': settings_dict.get('CONN_MAX_AGE', 0),
+            'health_checks': settings_dict.get('CONN_HEALTH_CHECKS', False),
+        }
+
+    return stats
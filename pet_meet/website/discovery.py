@@ -0,0 +1,152 @@
+"""
+Upcoming meetings by city (meetings/upcoming/), served from a per-city
+cache of the next DISCOVERY_WINDOW that signals keep current.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import DateTimeField
+from django.utils import timezone
+
+from . import cache, replicas, values
+from .models import Meeting
+from .pagination import KeysetPagination
+from .serializers import MeetingUpcomingSerializer
+
+
+# how far before now a window may start to be cached
+CACHED_START_SLACK = timedelta(minutes=1)
+
+def get_window(start=None, end=None):
+    """
+    The [start, end) window from the `from` / `to` query parameters,
+    by default the next DISCOVERY_WINDOW.
+    """
+    field = DateTimeField()
+    start = field.to_python(start) if start else timezone.now()
+    end = field.to_python(end) if end else start + settings.DISCOVERY_WINDOW
+    start, end = [
+        timezone.make_aware(time) if timezone.is_naive(time) else time
+        for time in (start, end)
+    ]
+    if end <= start:
+        raise ValidationError('`to` must be after `from`')
+
+    return start, end
+
+
+def upcoming(city, start, end):
+    return Meeting.objects.filter(city=city, time__gte=start, time__lt=end)
+
+
+def _key(city):
+    return f'upcoming:{city}:{cache.get_all_version()}'
+
+
+def _rows(queryset):
+    mapper = values.get_mapper(MeetingUpcomingSerializer)
+    return [
+        {'time': row['time'], 'id': row['id'], 'data': mapper(row)}
+        for row in mapper.select(queryset.order_by('time', 'id'), 'time', 'id')
+    ]
+
+
+def get_cached(city, start, end):
+    """
+    The cached rows of `city` in [start, end), or None when the window isn't
+    covered by the cache.
+    """
+    key = _key(city)
+    entry = cache.get_cache().get(key)
+    if entry is None:
+        now = timezone.now()
+        # only windows starting about now are worth caching, others are read from the database
+        if not now - CACHED_START_SLACK <= start <= now:
+            return None
+
+        # long enough to still cover the window when the entry expires
+        entry_end = now + settings.DISCOVERY_WINDOW + timedelta(seconds=settings.DISCOVERY_CACHE_TIMEOUT)
+        with replicas.primary():
+            entry = {'start': start, 'end': entry_end, 'rows': _rows(upcoming(city, start, entry_end))}
+        cache.get_cache().set(key, entry, timeout=settings.DISCOVERY_CACHE_TIMEOUT)
+
+    if start < entry['start'] or end > entry['end']:
+        return None
+
+    return [row for row in entry['rows'] if start <= row['time'] < end]
+
+
+def with_attendee_counts(rows):
+    """
+    The data of `rows` with current attendee counts, leaving out meetings
+    deleted since they were cached.
+    """
+    counts = dict(Meeting.objects.filter(id__in=[row['id'] for row in rows]).values_list('id', 'attendee_count'))
+    return [
+        {**row['data'], 'attendee_count': counts[row['id']]}
+        for row in rows if row['id'] in counts
+    ]
+
+
+def _update(city, meeting_id):
+    key = _key(city)
+    entry = cache.get_cache().get(key)
+    if entry is None:
+        return
+
+    rows = [row for row in entry['rows'] if row['id'] != meeting_id]
+    queryset = upcoming(city, entry['start'], entry['end']).filter(id=meeting_id)
+    rows += _rows(queryset)
+    rows.sort(key=lambda row: (row['time'], row['id']))
+    entry['rows'] = rows
+    cache.get_cache().set(key, entry, timeout=settings.DISCOVERY_CACHE_TIMEOUT)
+
+
+def creator_changed(user_id):
+    """
+    Drops the cached entries of the cities of the user's upcoming meetings,
+    which embed the user's name, once the transaction commits.
+    """
+    cities = list(
+        Meeting.objects.filter(creator_id=user_id, time__gte=timezone.now())
+        .order_by().values_list('city', flat=True).distinct()
+    )
+    transaction.on_commit(lambda: cache.get_cache().delete_many([_key(city) for city in cities]))
+
+
+def meeting_changed(meeting):
+    """
+    Puts a created, moved or deleted meeting in (or out of) its city's
+    cached entry once the transaction commits.
+    """
+    # the pk of a deleted meeting is None by the time the transaction commits
+    city, pk = meeting.city, meeting.pk
+    transaction.on_commit(lambda: _update(city, pk))
+
+
+class UpcomingPagination(KeysetPagination):
+    """
+    Keyset pagination by meeting time, over a queryset or the rows of the
+    cache.
+    """
+    ordering = ('time', 'id')
+
+    def get_ordering_fields(self, queryset):
+        return [Meeting._meta.get_field(name) for name in self.ordering]
+
+    def get_page_queryset(self, queryset):
+        if not isinstance(queryset, list):
+            return super().get_page_queryset(queryset)
+
+        rows = queryset
+        if self.cursor is not None:
+            reverse, position = self.cursor
+            position = tuple(position)
+            if reverse:
+                rows = [row for row in reversed(rows) if tuple(self.get_position(row)) < position]
+            else:
+                rows = [row for row in rows if tuple(self.get_position(row)) > position]
+
+        return rows[:self.page_size + 1]
@@ -0,0 +1,68 @@
+"""
+Streaming NDJSON / CSV export of everything posted in a group
+(groups/<id>/export/), read with `QuerySet.iterator()`.
+"""
+import csv
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .models import Meeting, Post, Comment
+
+
+# type: (model, the group lookup, exported columns)
+EXPORTED = {
+    'post': (Post, 'group_id', ('id', 'title', 'text', 'user_id', 'created_at', 'updated_at')),
+    'comment': (Comment, 'post__group_id', ('id', 'post_id', 'text', 'rating', 'user_id', 'created_at', 'updated_at')),
+    'meeting': (Meeting, 'group_id', (
+        'id', 'title', 'location', 'time', 'creator_id', 'attendee_count', 'created_at', 'updated_at'
+    )),
+}
+# every column of the CSV, rows leave the columns of the other types empty
+CSV_COLUMNS = ['type'] + list(dict.fromkeys(column for _, _, columns in EXPORTED.values() for column in columns))
+
+
+def rows(group_id):
+    for kind, (model, lookup, columns) in EXPORTED.items():
+        queryset = model.objects.filter(**{lookup: group_id}).order_by('id').values(*columns)
+        for row in queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+            yield kind, row
+
+
+def ndjson(group_id):
+    encoder = DjangoJSONEncoder()
+    for kind, row in rows(group_id):
+        yield encoder.encode({'type': kind, **row}) + '\n'
+
+
+class Echo:
+    """
+    A file-like object handing back what is written to it, so csv.writer
+    output can be streamed line by line.
+    """
+    def write(self, value):
+        return value
+
+
+def csv_lines(group_id):
+    writer = csv.DictWriter(Echo(), fieldnames=CSV_COLUMNS)
+    yield writer.writeheader()
+    for kind, row in rows(group_id):
+        yield writer.writerow({
+            'type': kind,
+            **{column: value.isoformat() if hasattr(value, 'isoformat') else value for column, value in row.items()}
+        })
+
+
+FORMATS = {
+    'ndjson': (ndjson, 'application/x-ndjson'),
+    'csv': (csv_lines, 'text/csv'),
+}
+
+
+def export_response(group_id, output):
+    lines, content_type = FORMATS[output]
+    response = StreamingHttpResponse(lines(group_id), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="group-{group_id}.{output}"'
+    return response
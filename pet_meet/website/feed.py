@@ -0,0 +1,212 @@
+"""
+Per-user activity feed (feed/): entries fanned out to a group's participants
+on write, or read from groups with too many participants (fanout_on_read).
+"""
+import logging
+import queue
+import random
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import CharField, DateTimeField, F, IntegerField, Q, Value
+
+from . import cache
+from .models import FeedEntry, Group, Meeting, Post
+from .pagination import KeysetPagination
+from .serializers import MeetingIndexSerializer, PostIndexSerializer
+
+
+logger = logging.getLogger(__name__)
+
+# kind: (model, serializer)
+KINDS = {
+    'post': (Post, PostIndexSerializer),
+    'meeting': (Meeting, MeetingIndexSerializer),
+}
+# feed items embed their group
+EXPAND = ('group',)
+
+
+def get_kind(model):
+    return next(kind for kind, (kind_model, _) in KINDS.items() if kind_model is model)
+
+
+def get_participants(group_id, limit):
+    """
+    The ids of up to `limit` users taking part in the group.
+    """
+    creator = Group.objects.filter(id=group_id).order_by().values_list('creator_id')
+    posters = Post.objects.filter(group_id=group_id).order_by().values_list('user_id')
+    attendees = Meeting.attendees.through.objects.filter(meeting__group_id=group_id).values_list('user_id')
+    return [user_id for user_id, in creator.union(posters, attendees)[:limit]]
+
+
+def get_fanout_on_read_groups(user_id):
+    return Group.objects.filter(fanout_on_read=True).filter(
+        Q(creator_id=user_id)
+        | Q(id__in=Post.objects.filter(user_id=user_id).values('group_id'))
+        | Q(id__in=Meeting.objects.filter(attendees=user_id).values('group_id'))
+    ).values_list('id', flat=True)
+
+
+def fan_out(instances, max_entries=None):
+    """
+    Inserts the feed entries of new posts or of new meetings, with one
+    participants query and one INSERT per group. The groups that don't fit
+    in `max_entries` entries are deferred to the background worker.
+    """
+    if not instances:
+        return
+
+    kind = get_kind(type(instances[0]))
+    by_group = {}
+    for instance in instances:
+        by_group.setdefault(instance.group_id, []).append(instance)
+
+    on_read = set(Group.objects.filter(id__in=by_group, fanout_on_read=True).values_list('id', flat=True))
+    remaining = max_entries
+    deferred = []
+    for group_id, items in by_group.items():
+        if group_id in on_read:
+            continue
+
+        participants = get_participants(group_id, settings.FEED_FANOUT_LIMIT + 1)
+        if len(participants) > settings.FEED_FANOUT_LIMIT:
+            Group.objects.filter(id=group_id).update(fanout_on_read=True)
+            cache.invalidate((Group, group_id))
+            continue
+
+        if remaining is not None:
+            if len(items) * len(participants) > remaining:
+                deferred += items
+                continue
+            remaining -= len(items) * len(participants)
+
+        FeedEntry.objects.bulk_create([
+            FeedEntry(user_id=user_id, kind=kind, object_id=item.pk, created_at=item.created_at)
+            for item in items for user_id in participants
+        ], batch_size=1000)
+        trim([user_id for user_id in participants if random.randrange(settings.FEED_TRIM_INTERVAL) == 0])
+
+    if deferred:
+        defer(deferred)
+
+
+class Worker(threading.Thread):
+    """
+    Fans out the items deferred by requests, one batch at a time. Items still
+    queued when the process exits are not fanned out.
+    """
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.queue = queue.SimpleQueue()
+
+    def run(self):
+        while True:
+            instances = self.queue.get()
+            try:
+                fan_out(instances)
+            except Exception:
+                logger.exception('deferred fan-out of %s %ss failed', len(instances), get_kind(type(instances[0])))
+            finally:
+                connections.close_all()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def defer(instances):
+    global _worker
+    with _worker_lock:
+        # started on first use, so that it isn't started before the server forks its workers
+        if _worker is None:
+            _worker = Worker()
+            _worker.start()
+
+    _worker.queue.put(instances)
+
+
+def published(instances):
+    """
+    Fans new posts or meetings out once the current transaction commits.
+    """
+    instances = list(instances)
+    transaction.on_commit(lambda: fan_out(instances, settings.FEED_FANOUT_MAX_ENTRIES))
+
+
+def trim(user_ids):
+    """
+    Deletes the entries of the users' feeds after their FEED_MAX_LENGTH newest.
+    """
+    pagination = FeedPagination()
+    for user_id in user_ids:
+        entries = FeedEntry.objects.filter(user_id=user_id)
+        newest_first = [f'-{name}' for name in pagination.ordering]
+        index = settings.FEED_MAX_LENGTH - 1
+        for last in entries.order_by(*newest_first).values_list(*pagination.ordering)[index:index + 1]:
+            entries.filter(pagination.get_position_filter(last, reverse=True)).delete()
+
+
+def load_items(rows):
+    """
+    The feed items of the page `rows`, one query per kind.
+    """
+    ids = {}
+    for row in rows:
+        ids.setdefault(row['kind'], []).append(row['object_id'])
+
+    objects = {}
+    for kind, kind_ids in ids.items():
+        model, serializer_class = KINDS[kind]
+        instances = list(serializer_class.setup_eager_loading(model.objects.filter(id__in=kind_ids), expand=EXPAND))
+        for instance, data in zip(instances, serializer_class(instances, many=True, expand=EXPAND).data):
+            objects[kind, instance.pk] = data
+
+    return [
+        {'type': row['kind'], 'id': row['object_id'], 'created_at': row['created_at'], 'object': objects[row['kind'], row['object_id']]}
+        for row in rows if (row['kind'], row['object_id']) in objects
+    ]
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Keyset pagination over the feed of a user (the paginated "queryset" is
+    the user id), newest first: the next page holds older items. Items of
+    the user's fan-out on read groups are merged in with the same ordering.
+    """
+    ordering = ('created_at', 'kind', 'object_id')
+
+    def get_ordering_fields(self, user_id):
+        return [DateTimeField(), CharField(), IntegerField()]
+
+    def get_sources(self, user_id):
+        sources = [FeedEntry.objects.filter(user_id=user_id).values(*self.ordering)]
+        groups = list(get_fanout_on_read_groups(user_id))
+        if groups:
+            for kind, (model, _) in KINDS.items():
+                sources.append(
+                    model.objects.filter(group_id__in=groups)
+                    .annotate(kind=Value(kind, output_field=CharField()), object_id=F('id'))
+                    .values(*self.ordering)
+                )
+
+        return sources
+
+    def get_page_queryset(self, user_id):
+        # previous pages hold newer items
+        newer = self.cursor is not None and self.cursor[0]
+        ordering = self.ordering if newer else [f'-{name}' for name in self.ordering]
+        rows = {}
+        for queryset in self.get_sources(user_id):
+            if self.cursor is not None:
+                queryset = queryset.filter(self.get_position_filter(self.cursor[1], reverse=not newer))
+            for row in queryset.order_by(*ordering)[:self.page_size + 1]:
+                # an object of a group switched to fan-out on read can also have entries
+                rows[row['kind'], row['object_id']] = row
+
+        def position(row):
+            return [row[name] for name in self.ordering]
+
+        return sorted(rows.values(), key=position, reverse=not newer)[:self.page_size + 1]
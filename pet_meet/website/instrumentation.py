@@ -0,0 +1,119 @@
+"""
+Per-request query and timing measurements.
+
+`website.middleware.InstrumentationMiddleware` starts a `Measurement` for
+each request, counts and times its queries through the connections' execute
+wrappers, and records the result per URL pattern. Code doing work worth
+measuring separately (serializers) wraps it in `timed()`.
+
+The recent measurements of each pattern are kept in memory to report
+percentiles, so with several worker processes each one reports its own.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+PERCENTILES = (50, 95, 99)
+
+_current = ContextVar('measurement', default=None)
+_routes = defaultdict(lambda: {'count': 0, 'samples': deque(maxlen=settings.INSTRUMENTATION_SAMPLE_SIZE)})
+_routes_lock = threading.Lock()
+
+
+class Measurement:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.view_time = 0.0
+        self.depth = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'serialize_ms': round(self.serialize_time * 1000, 2),
+            'view_ms': round(self.view_time * 1000, 2)
+        }
+
+
+@contextmanager
+def measure():
+    measurement = Measurement()
+    token = _current.set(measurement)
+    try:
+        yield measurement
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """
+    Adds the time spent in the block to the `<name>_time` of the current
+    measurement. Nested blocks (a serializer inside a serializer) are only
+    counted once.
+    """
+    measurement = _current.get()
+    if measurement is None or measurement.depth:
+        yield
+        return
+
+    measurement.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        measurement.depth -= 1
+        setattr(measurement, f'{name}_time', getattr(measurement, f'{name}_time') + time.perf_counter() - start)
+
+
+def record(route, measurement):
+    with _routes_lock:
+        stats = _routes[route]
+        stats['count'] += 1
+        stats['samples'].append(measurement.as_dict())
+
+
+def percentiles(values):
+    values = sorted(values)
+    # nearest rank
+    return {
+        f'p{percentile}': values[max(0, -(-percentile * len(values) // 100) - 1)]
+        for percentile in PERCENTILES
+    }
+
+
+def get_stats():
+    with _routes_lock:
+        routes = {route: (stats['count'], list(stats['samples'])) for route, stats in _routes.items()}
+
+    return {
+        route: {
+            'count': count,
+            'samples': len(samples),
+            **{
+                metric: percentiles([sample[metric] for sample in samples])
+                for metric in ('queries', 'db_ms', 'serialize_ms', 'view_ms')
+            }
+        }
+        for route, (count, samples) in sorted(routes.items())
+    }
+
+
+def reset():
+    with _routes_lock:
+        _routes.clear()
@@ -0,0 +1,295 @@
+import asyncio
+import json
+import re
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from website import async_views, urls, views
+from website.authentication import TokenObtainPairSerializer
+from website.instrumentation import percentiles
+from website.models import User, Meeting, Group, Post, Comment, Animal
+
+
+PARAMETER_MODELS = {'user_id': User, 'group_id': Group, 'post_id': Post, 'meeting_id': Meeting}
+# query strings of routes that need one
+QUERY_STRINGS = {'/search/': 'q=dog'}
+# write routes safe to repeat: each pair of requests leaves the data as it was
+TOGGLE_VIEWS = (views.MeetingAttendAPIView, views.MeetingUnattendAPIView)
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def get_routes():
+    """
+    (method, route, view class) of every route of website/urls.py the
+    benchmark can drive, and the routes it skips.
+    """
+    routes = []
+    skipped = []
+    for pattern in urls.urlpatterns:
+        view_class = getattr(pattern.callback, 'view_class', None)
+        route = f'/{pattern.pattern}'
+        if view_class is None or view_class.__module__ not in (views.__name__, async_views.__name__):
+            skipped.append(route)
+        elif hasattr(view_class, 'get'):
+            routes.append(('GET', route, view_class))
+        elif issubclass(view_class, TOGGLE_VIEWS):
+            routes.append(('POST', route, view_class))
+        else:
+            skipped.append(route)
+
+    return routes, skipped
+
+
+def build_path(route, view_class):
+    """
+    Fills the route parameters with the oldest rows, which the `seed`
+    command makes the most active ones.
+    """
+    def sample_id(match):
+        name = match.group(1)
+        model = PARAMETER_MODELS.get(name) or view_class.serializer_class.Meta.model
+        pk = model.objects.order_by('id').values_list('id', flat=True).first()
+        if pk is None:
+            raise CommandError(f'No {model._meta.verbose_name} to request {route} with, run `seed` first')
+        return str(pk)
+
+    path = re.sub(r'<(?:\w+:)?(\w+)>', sample_id, route)
+    return f'{path}?{QUERY_STRINGS[route]}' if route in QUERY_STRINGS else path
+
+
+class ClientDriver:
+    """
+    Requests through the Django test client, in this process and one at a time.
+    """
+    concurrency = 1
+
+    def __init__(self, user):
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def send(self, method, path):
+        response = getattr(self.client, method.lower())(path)
+        if response.streaming:
+            response.getvalue()
+        return response.status_code, response.get('Server-Timing')
+
+
+def get_authorization(user):
+    # with the claims of a signed in user's tokens, which spare requests the user query
+    return f'Bearer {TokenObtainPairSerializer.get_token(user).access_token}'
+
+
+class HTTPDriver:
+    """
+    Requests to a running server from `concurrency` threads.
+    """
+    def __init__(self, user, url, concurrency):
+        self.url = url.rstrip('/')
+        self.concurrency = concurrency
+        self.headers = {'Authorization': get_authorization(user)}
+
+    def send(self, method, path):
+        request = urllib.request.Request(self.url + path, method=method, headers=self.headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status, response.headers.get('Server-Timing')
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code, error.headers.get('Server-Timing')
+
+
+class ASGIDriver:
+    """
+    Requests through the project's ASGI application in this process,
+    `concurrency` at a time from one event loop, the way an ASGI server
+    runs them.
+    """
+    def __init__(self, user, concurrency):
+        self.application = get_asgi_application()
+        self.concurrency = concurrency
+        self.headers = [
+            (b'host', b'testserver'),
+            (b'authorization', get_authorization(user).encode())
+        ]
+
+    async def asend(self, method, path):
+        path, _, query_string = path.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+            'method': method, 'path': path, 'raw_path': path.encode(), 'query_string': query_string.encode(),
+            'root_path': '', 'headers': self.headers, 'client': ('127.0.0.1', 0), 'server': ('testserver', 80)
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await self.application(scope, receive, send)
+        start = messages[0]
+        server_timing = {name.lower(): value for name, value in start['headers']}.get(b'server-timing')
+        return start['status'], server_timing.decode() if server_timing else None
+
+
+def get_sample(start, status, server_timing):
+    latency = round((time.perf_counter() - start) * 1000, 2)
+    match = QUERIES.search(server_timing or '')
+    return latency, status, int(match.group(1)) if match else None
+
+
+def summarize(samples, elapsed):
+    latencies = [latency for latency, _, _ in samples]
+    queries = [count for _, _, count in samples if count is not None]
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status, _ in samples if status >= 400),
+        'statuses': statuses,
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'latency_ms': {
+            **percentiles(latencies),
+            'mean': round(sum(latencies) / len(latencies), 2),
+            'max': max(latencies)
+        },
+        'queries': {**percentiles(queries), 'max': max(queries)} if queries else None
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Requests every route of website/urls.py and reports throughput, latency percentiles and queries '
+        'per request, through the test client, concurrently through the ASGI application with --asgi or, '
+        'with --url, concurrently against a server using the same database. Results are written as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--asgi', action='store_true', help='Request through the ASGI application in this process')
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight with --url or --asgi')
+        parser.add_argument('--requests', type=int, default=100, help='Requests per route')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per route')
+        parser.add_argument('--user', help='Email of the user to request as, defaults to a superuser')
+        parser.add_argument('--route', action='append', help='Only benchmark routes containing this text')
+        parser.add_argument('--output', help='Result file, defaults to benchmarks/<time>.json')
+        parser.add_argument('--compare', help='Earlier result file to compare with')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        if options['url']:
+            driver = HTTPDriver(user, options['url'], options['concurrency'])
+        elif options['asgi']:
+            driver = ASGIDriver(user, options['concurrency'])
+        else:
+            driver = ClientDriver(user)
+
+        routes, skipped = get_routes()
+        if options['route']:
+            routes = [route for route in routes if any(text in route[1] for text in options['route'])]
+
+        results = {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'driver': type(driver).__name__,
+            'url': options['url'],
+            'concurrency': driver.concurrency,
+            'database': connection.vendor,
+            'rows': {model.__name__: model.objects.count() for model in (User, Group, Post, Comment, Meeting, Animal)},
+            'routes': {},
+            'skipped': skipped
+        }
+        # the test client requests `testserver`
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for method, route, view_class in routes:
+                path = build_path(route, view_class)
+                summary = self.run(driver, method, path, options['warmup'], options['requests'])
+                results['routes'][f'{method} {route}'] = {'path': path, **summary}
+                self.stdout.write(
+                    f'{method:4} {route:45} {summary["throughput_rps"]:>8} req/s  '
+                    f'p50 {summary["latency_ms"]["p50"]:>8} ms  p95 {summary["latency_ms"]["p95"]:>8} ms  '
+                    f'queries {summary["queries"]["p50"] if summary["queries"] else "-":>3}  errors {summary["errors"]}'
+                )
+
+        output = Path(options['output'] or settings.BASE_DIR / 'benchmarks' / f'{time.strftime("%Y%m%d-%H%M%S")}.json')
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text()), results)
+
+    def get_user(self, email):
+        users = User.objects.all()
+        user = users.filter(email=email).first() if email else (
+            users.filter(is_superuser=True).order_by('id').first() or users.order_by('id').first()
+        )
+        if user is None:
+            raise CommandError('No user to request as, run `seed` first')
+
+        return user
+
+    def run(self, driver, method, path, warmup, requests):
+        if isinstance(driver, ASGIDriver):
+            return asyncio.run(self.arun(driver, method, path, warmup, requests))
+
+        def send(_):
+            start = time.perf_counter()
+            return get_sample(start, *driver.send(method, path))
+
+        for i in range(warmup):
+            send(i)
+
+        start = time.perf_counter()
+        if driver.concurrency > 1:
+            with ThreadPoolExecutor(driver.concurrency) as executor:
+                samples = list(executor.map(send, range(requests)))
+        else:
+            samples = [send(i) for i in range(requests)]
+
+        return summarize(samples, time.perf_counter() - start)
+
+    async def arun(self, driver, method, path, warmup, requests):
+        in_flight = asyncio.Semaphore(driver.concurrency)
+
+        async def send(_):
+            async with in_flight:
+                start = time.perf_counter()
+                return get_sample(start, *await driver.asend(method, path))
+
+        for i in range(warmup):
+            await send(i)
+
+        start = time.perf_counter()
+        samples = await asyncio.gather(*[send(i) for i in range(requests)])
+        return summarize(samples, time.perf_counter() - start)
+
+    def compare(self, before, after):
+        self.stdout.write(f'\nCompared with the run of {before["started_at"]}:')
+        for name, result in after['routes'].items():
+            # an async route is compared with its sync variant when the earlier run lacks it
+            previous = before['routes'].get(name) or before['routes'].get(name.replace(' /async/', ' /', 1))
+            if previous is None:
+                continue
+
+            change = (result['latency_ms']['p50'] - previous['latency_ms']['p50']) / (previous['latency_ms']['p50'] or 1)
+            line = (
+                f'{name:50} p50 {previous["latency_ms"]["p50"]:>8} -> {result["latency_ms"]["p50"]:>8} ms ({change:+.0%})  '
+                f'p95 {previous["latency_ms"]["p95"]:>8} -> {result["latency_ms"]["p95"]:>8} ms  '
+                f'{previous["throughput_rps"]:>8} -> {result["throughput_rps"]:>8} req/s'
+            )
+            style = self.style.ERROR if change > 0.1 else self.style.SUCCESS if change < -0.1 else str
+            self.stdout.write(style(line))
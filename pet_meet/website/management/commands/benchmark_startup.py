@@ -0,0 +1,79 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from website import schema
+
+
+# Starts the app the way a worker does: settings, apps, middleware and URLs.
+# "eager" also imports what startup imported before the API docs were loaded
+# lazily: drf_yasg and rest_framework_swagger (when still installed) as
+# installed apps and drf_yasg's views from website/urls.py.
+STARTUP = '''
+import json, sys, time
+start = time.perf_counter()
+if sys.argv[1] == 'eager':
+    import importlib.util
+    for name in ('drf_yasg', 'rest_framework_swagger'):
+        if importlib.util.find_spec(name) is not None:
+            __import__(name)
+import django
+django.setup()
+from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+get_wsgi_application()
+get_resolver().url_patterns
+if sys.argv[1] == 'eager':
+    import drf_yasg.openapi, drf_yasg.views
+print(json.dumps({'seconds': time.perf_counter() - start, 'modules': len(sys.modules)}))
+'''
+MODES = ('eager', 'lazy')
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the startup time of a worker in fresh processes, with the API docs tooling imported '
+        'lazily (as configured) and eagerly (as before)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10, help='Processes started per mode')
+
+    def handle(self, *args, **options):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+            'PYTHONPATH': os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+        }
+        samples = {mode: [] for mode in MODES}
+        # the modes take turns, the first round only warms up the file system cache
+        for round in range(options['runs'] + 1):
+            for mode in MODES:
+                output = subprocess.run(
+                    [sys.executable, '-c', STARTUP, mode], env=env, check=True, capture_output=True, text=True
+                ).stdout
+                if round:
+                    samples[mode].append(json.loads(output.strip().splitlines()[-1]))
+
+        medians = {}
+        for mode, runs in samples.items():
+            milliseconds = [run['seconds'] * 1000 for run in runs]
+            medians[mode] = statistics.median(milliseconds)
+            self.stdout.write(
+                f'{mode:6} median {medians[mode]:>8.1f} ms  min {min(milliseconds):>8.1f} ms  '
+                f'modules {runs[-1]["modules"]}'
+            )
+
+        change = (medians['lazy'] - medians['eager']) / medians['eager']
+        self.stdout.write(self.style.SUCCESS(f'Startup {medians["eager"]:.1f} -> {medians["lazy"]:.1f} ms ({change:+.0%})'))
+
+        start = time.perf_counter()
+        schema.generate()
+        built = (time.perf_counter() - start) * 1000
+        self.stdout.write(f'Building the schema for the docs takes {built:.1f} ms, `generate_schema` does it once')
@@ -0,0 +1,87 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from website.discovery import UpcomingPagination, upcoming
+from website.models import User, Meeting, Group, Post, Comment, Animal
+from website.pagination import KeysetPagination
+from website.serializers import (
+    AnimalIndexSerializer, CommentIndexSerializer, GroupIndexSerializer,
+    MeetingIndexSerializer, MeetingUpcomingSerializer, PostIndexSerializer, UserIndexSerializer
+)
+
+
+def keyset_page(queryset, paginator_class=KeysetPagination):
+    """
+    The query KeysetPagination runs for a page after the first one.
+    """
+    paginator = paginator_class()
+    paginator.cursor = (False, [timezone.now(), 0])
+    return paginator.get_page_queryset(queryset)
+
+
+def endpoint_queries():
+    """
+    The main query of each list endpoint, shaped the way the views build it.
+    Parameter values don't matter for the plan, so placeholders are used.
+    """
+    return [
+        ('users/', UserIndexSerializer.setup_eager_loading(User.objects.all())[:25]),
+        ('groups/?city=', GroupIndexSerializer.setup_eager_loading(Group.objects.filter(city='city'))[:25]),
+        ('groups/<id>/posts/', keyset_page(PostIndexSerializer.setup_eager_loading(Post.objects.filter(group_id=0)))),
+        ('groups/<id>/meetings/', keyset_page(MeetingIndexSerializer.setup_eager_loading(Meeting.objects.filter(group_id=0)))),
+        ('groups/<id>/meetings/ by time', Meeting.objects.filter(group_id=0).order_by('time')[:25]),
+        ('posts/<id>/comments/', keyset_page(CommentIndexSerializer.setup_eager_loading(Comment.objects.filter(post_id=0)))),
+        ('users/<id>/animals/', keyset_page(AnimalIndexSerializer.setup_eager_loading(Animal.objects.filter(user_id=0)))),
+        ('meetings/upcoming/', keyset_page(
+            MeetingUpcomingSerializer.setup_eager_loading(upcoming('city', timezone.now(), timezone.now())),
+            UpcomingPagination
+        )),
+    ]
+
+
+def check_plan(plan, table, vendor):
+    """
+    Returns (uses_index, sorts) for the scan of `table` in an EXPLAIN output.
+    """
+    if vendor == 'postgresql':
+        uses_index = re.search(rf'(Index Scan|Index Only Scan|Bitmap Heap Scan)( Backward)?( using \S+)? on {table}\b', plan) is not None
+        sorts = re.search(r'^\s*(->\s*)?(Incremental )?Sort\b', plan, re.MULTILINE) is not None
+    else:
+        uses_index = re.search(rf'(SEARCH|SCAN) {table} USING', plan) is not None
+        sorts = 'USE TEMP B-TREE FOR ORDER BY' in plan
+
+    return uses_index, sorts
+
+
+class Command(BaseCommand):
+    help = 'Runs EXPLAIN for the query of each list endpoint and reports whether it is served by an index'
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        failures = []
+        with transaction.atomic():
+            if vendor == 'postgresql':
+                # small development tables are cheaper to scan, force the planner to show
+                # whether an index can serve the query at all
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, queryset in endpoint_queries():
+                plan = queryset.explain()
+                uses_index, sorts = check_plan(plan, queryset.model._meta.db_table, vendor)
+                if not uses_index:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f'NO INDEX  {name}'))
+                elif sorts:
+                    self.stdout.write(self.style.WARNING(f'SORT      {name}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'OK        {name}'))
+
+                if options['verbosity'] > 1:
+                    self.stdout.write(plan + '\n')
+
+        if failures:
+            raise CommandError(f'Queries not served by an index: {", ".join(failures)}')
@@ -0,0 +1,19 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from website import schema
+
+
+class Command(BaseCommand):
+    help = 'Writes the OpenAPI schema of the API to SCHEMA_FILE, served by the API docs instead of building it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Schema file, defaults to SCHEMA_FILE')
+
+    def handle(self, *args, **options):
+        output = Path(options['output'] or settings.SCHEMA_FILE)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_bytes(schema.generate())
+        self.stdout.write(self.style.SUCCESS(f'Schema written to {output}'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from website.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = 'Prints a token for the X-Profile header, which makes the profiler sample that request'
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_token())
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from website.counters import recompute_counters
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the attendee, post and meeting counters of meetings and groups'
+
+    def handle(self, *args, **options):
+        recompute_counters()
+        self.stdout.write(self.style.SUCCESS('Counters recomputed'))
@@ -0,0 +1,151 @@
+import random
+import time
+import uuid
+from array import array
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from website import cache
+from website.counters import recompute_counters
+from website.models import User, Meeting, Group, Post, Comment, Animal
+
+
+CITIES = (
+    'Almaty', 'Astana', 'Shymkent', 'Karaganda', 'Aktobe', 'Taraz', 'Pavlodar',
+    'Ust-Kamenogorsk', 'Semey', 'Atyrau', 'Kostanay', 'Kyzylorda', 'Oral', 'Aktau'
+)
+FIRST_NAMES = ('Aigerim', 'Altynai', 'Arman', 'Dana', 'Daniyar', 'Aruzhan', 'Timur', 'Madina', 'Nursultan', 'Zarina')
+LAST_NAMES = ('Akhmetova', 'Bekov', 'Iskakova', 'Kassymov', 'Nurlanova', 'Omarov', 'Sadykova', 'Tokayev')
+BREEDS = ('Labrador', 'Husky', 'Corgi', 'Beagle', 'Persian', 'Siamese', 'Maine Coon', None)
+WORDS = (
+    'dog', 'cat', 'walk', 'park', 'leash', 'vet', 'food', 'toy', 'training', 'puppy', 'kitten',
+    'weekend', 'meetup', 'river', 'ball', 'groomer', 'shelter', 'adopt', 'morning', 'evening'
+)
+SKEW = 3  # the higher, the more activity goes to the first (popular) users, groups and posts
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates synthetic users, groups, posts, comments, meetings, attendees and animals '
+        'with skewed activity, e.g. `seed --users 1000000 --groups 100000 --posts 10000000 --comments 10000000`'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--meetings', type=int, default=1000)
+        parser.add_argument('--animals', type=int, default=1000)
+        parser.add_argument('--attendees', type=int, default=10, help='Mean number of attendees per meeting')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--random-seed', type=int, help='Same seed, same data (apart from the email domain)')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['random_seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        # emails are unique, so every run gets its own domain
+        run = uuid.uuid4().hex[:8]
+        password = make_password('password')
+
+        users = self.insert(User, options['users'], lambda i: User(
+            email=f'user{i}@{run}.example.com',
+            password=password,
+            first_name=self.random.choice(FIRST_NAMES),
+            last_name=self.random.choice(LAST_NAMES),
+            address_city=self.city(),
+            address_country='Kazakhstan',
+            bio=self.text(12)
+        ))
+        groups = self.insert(Group, options['groups'], lambda i: Group(
+            name=f'{self.text(2).title()} {i}',
+            city=self.city(),
+            creator_id=self.pick(users)
+        ))
+        posts = self.insert(Post, options['posts'], lambda i: Post(
+            title=self.text(5),
+            text=self.text(40),
+            user_id=self.pick(users),
+            group_id=self.pick(groups)
+        ))
+        self.insert(Comment, options['comments'], lambda i: Comment(
+            text=self.text(15),
+            rating=str(self.random.randint(1, 5)),
+            post_id=self.pick(posts),
+            user_id=self.pick(users)
+        ), keep_ids=False)
+        group_cities = dict(Group.objects.filter(id__in=groups).values_list('id', 'city'))
+        meetings = self.insert(Meeting, options['meetings'], lambda i: self.meeting(groups, users, group_cities))
+        self.insert_attendees(meetings, users, options['attendees'])
+        self.insert(Animal, options['animals'], lambda i: Animal(
+            name=self.random.choice(FIRST_NAMES),
+            type=self.random.choice(('dog', 'cat')),
+            breed=self.random.choice(BREEDS),
+            user_id=self.pick(users)
+        ), keep_ids=False)
+
+        start = time.perf_counter()
+        recompute_counters()
+        # bulk_create sends no signals, make every cached response stale
+        cache.invalidate_all()
+        self.stdout.write(f'counters recomputed in {time.perf_counter() - start:.1f}s')
+        self.stdout.write(self.style.SUCCESS(f'Seeded, users can sign in as user<n>@{run}.example.com / password'))
+
+    def city(self):
+        return CITIES[int(len(CITIES) * self.random.random() ** SKEW)]
+
+    def text(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def pick(self, ids):
+        """
+        A skewed choice: the earlier an id was created, the likelier it is picked.
+        """
+        return ids[int(len(ids) * self.random.random() ** SKEW)]
+
+    def meeting(self, groups, users, group_cities):
+        group_id = self.pick(groups)
+        return Meeting(
+            title=self.text(4),
+            location=f'{self.text(2).title()} park',
+            time=self.now + timedelta(minutes=self.random.randint(-180 * 24 * 60, 180 * 24 * 60)),
+            city=group_cities[group_id],
+            group_id=group_id,
+            creator_id=self.pick(users)
+        )
+
+    def insert(self, model, count, build, keep_ids=True):
+        ids = array('q')
+        start = time.perf_counter()
+        for offset in range(0, count, self.batch_size):
+            objects = model.objects.bulk_create([
+                build(i) for i in range(offset, min(offset + self.batch_size, count))
+            ])
+            if keep_ids:
+                ids.extend(instance.pk for instance in objects)
+
+        self.stdout.write(f'{count} {model._meta.verbose_name_plural} in {time.perf_counter() - start:.1f}s')
+        return ids
+
+    def insert_attendees(self, meetings, users, mean):
+        Attendee = Meeting.attendees.through
+        batch = []
+        count = 0
+        start = time.perf_counter()
+        for meeting_id in meetings:
+            # pareto distributed with the requested mean: most meetings are small, a few are huge
+            size = min(len(users), int(mean / 3 * self.random.paretovariate(1.5)))
+            attendees = {self.pick(users) for _ in range(size)}
+            batch += [Attendee(meeting_id=meeting_id, user_id=user_id) for user_id in attendees]
+            if len(batch) >= self.batch_size:
+                Attendee.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+
+        Attendee.objects.bulk_create(batch)
+        count += len(batch)
+        self.stdout.write(f'{count} attendees in {time.perf_counter() - start:.1f}s')
@@ -1,16 +1,167 @@
-class DisableCSRF:
+import logging
+import random
+import re
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+
+from . import instrumentation, profiling, replicas
+
+
+logger = logging.getLogger(__name__)
+# one line per request, off unless enabled in LOGGING
+request_logger = logging.getLogger('website.requests')
+
+
+class DisableCSRF(MiddlewareMixin):
+    # MiddlewareMixin runs in sync and async mode, so async views aren't
+    # switched to a thread because of this middleware
+    def process_request(self, request):
+        setattr(request, '_dont_enforce_csrf_checks', True)
+
+
+class InstrumentationMiddleware:
+    """
+    Measures the queries, database time, serialization time and total view
+    time of each request, reports them in a `Server-Timing` header and a
+    `website.requests` log line, and records them per URL pattern (see
+    website/instrumentation.py).
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
-        # One-time configuration and initialization.
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # Code to be executed for each request before
-        # the view (and later middleware) are called.
-        setattr(request, '_dont_enforce_csrf_checks', True)
+        if self.is_async:
+            return self.__acall__(request)
+
+        with instrumentation.measure() as measurement, ExitStack() as stack:
+            self.wrap_connections(stack, measurement)
+            start = time.perf_counter()
+            response = self.get_response(request)
+            measurement.view_time = time.perf_counter() - start
+
+        return self.finish(request, response, measurement)
+
+    async def __acall__(self, request):
+        with instrumentation.measure() as measurement, ExitStack() as stack:
+            # the queries of async views run in a thread of the request, and
+            # connections are per thread, so they are wrapped in that thread
+            await sync_to_async(self.wrap_connections)(stack, measurement)
+            start = time.perf_counter()
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+            measurement.view_time = time.perf_counter() - start
+
+        return self.finish(request, response, measurement)
+
+    def wrap_connections(self, stack, measurement):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(measurement.execute_wrapper))
+
+    def finish(self, request, response, measurement):
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={measurement.db_time * 1000:.2f};desc="{measurement.queries} queries"',
+            f'serialize;dur={measurement.serialize_time * 1000:.2f}',
+            f'view;dur={measurement.view_time * 1000:.2f}'
+        ])
+
+        match = request.resolver_match
+        route = f'{request.method} /{match.route}' if match is not None else None
+        metrics = measurement.as_dict()
+        request_logger.info(
+            'method=%s path=%s route=%s status=%s queries=%s db_ms=%s serialize_ms=%s view_ms=%s',
+            request.method, request.path, route, response.status_code, *metrics.values(),
+            extra={'route': route, 'status': response.status_code, **metrics}
+        )
+        if route is not None:
+            instrumentation.record(route, measurement)
+
+        return response
+
 
-        response = self.get_response(request)
+class ReplicaMiddleware:
+    """
+    Routes the reads of safe requests to the read replicas, see
+    website/replicas.py.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        with replicas.routing(replicas.uses_replicas(request)):
+            response = self.get_response(request)
+
+        replicas.wrote(request, response)
+        return response
+
+    async def __acall__(self, request):
+        # the threads running the queries of async views copy the routing of the request
+        with replicas.routing(await sync_to_async(replicas.uses_replicas)(request)):
+            response = await self.get_response(request)
+
+        await sync_to_async(replicas.wrote)(request, response)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles one in PROFILER_RATE requests, and requests carrying a valid
+    `X-Profile` token, with the sampling profiler in website/profiling.py.
+    Not installed at all unless PROFILER_ENABLED is set.
+
+    Sync only, as the sampler follows the thread handling the request: under
+    ASGI an enabled profiler makes Django run the requests in threads.
+    """
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        if settings.PROFILER_RATE and random.randrange(settings.PROFILER_RATE) == 0:
+            return True
+
+        return profiling.has_valid_token(request)
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
 
-        # Code to be executed for each request/response after
-        # the view is called.
+        sampler = profiling.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
 
+        match = request.resolver_match
+        name = re.sub(r'[^a-zA-Z0-9]+', '-', f'{request.method} {match.route if match else request.path}').strip('-')
+        path = sampler.write(name)
+        logger.info(
+            'profiled method=%s path=%s samples=%s breakdown=%s output=%s',
+            request.method, request.path, sum(sampler.stacks.values()), sampler.get_breakdown(), path
+        )
         return response
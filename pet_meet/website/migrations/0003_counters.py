@@ -0,0 +1,59 @@
+# Generated by Django 4.2.6 on 2026-10-17 19:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def count(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('pk')).values('count')
+        ),
+        0
+    )
+
+
+def populate_counters(apps, schema_editor):
+    Group = apps.get_model('website', 'Group')
+    Meeting = apps.get_model('website', 'Meeting')
+    Post = apps.get_model('website', 'Post')
+
+    Meeting.objects.update(attendee_count=count(Meeting.attendees.through.objects.all(), 'meeting_id'))
+    Group.objects.update(
+        post_count=count(Post.objects.all(), 'group_id'),
+        meeting_count=count(Meeting.objects.all(), 'group_id'),
+        upcoming_meeting_count=count(Meeting.objects.filter(time__gt=timezone.now()), 'group_id')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='meeting_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='upcoming_meeting_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='meeting',
+            name='attendee_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
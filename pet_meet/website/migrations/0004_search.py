@@ -0,0 +1,75 @@
+# Generated by Django 4.2.6 on 2026-10-17 20:05
+
+from django.db import migrations
+
+
+# table: searched columns, see website/search.py
+SEARCHED = {
+    'website_post': ('title', 'text'),
+    'website_comment': ('text',),
+    'website_group': ('name', 'city'),
+}
+
+
+def postgresql_forwards(schema_editor, table, columns):
+    document = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+    schema_editor.execute(
+        f"ALTER TABLE {table} ADD COLUMN search_vector tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('simple', {document})) STORED"
+    )
+    schema_editor.execute(f'CREATE INDEX {table}_search_idx ON {table} USING GIN (search_vector)')
+
+
+def postgresql_backwards(schema_editor, table, columns):
+    schema_editor.execute(f'ALTER TABLE {table} DROP COLUMN search_vector')
+
+
+def sqlite_forwards(schema_editor, table, columns):
+    # an external content FTS5 table: only the index is stored, the rows are read from `table`
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    delete = f"INSERT INTO {table}_search ({table}_search, rowid, {names}) VALUES ('delete', old.id, {old});"
+    insert = f'INSERT INTO {table}_search (rowid, {names}) VALUES (new.id, {new});'
+    schema_editor.execute(f"CREATE VIRTUAL TABLE {table}_search USING fts5({names}, content='{table}', content_rowid='id')")
+    schema_editor.execute(f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN {insert} END')
+    schema_editor.execute(f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN {delete} END')
+    schema_editor.execute(f'CREATE TRIGGER {table}_search_update AFTER UPDATE ON {table} BEGIN {delete} {insert} END')
+    schema_editor.execute(f"INSERT INTO {table}_search ({table}_search) VALUES ('rebuild')")
+
+
+def sqlite_backwards(schema_editor, table, columns):
+    for trigger in ('insert', 'delete', 'update'):
+        schema_editor.execute(f'DROP TRIGGER {table}_search_{trigger}')
+    schema_editor.execute(f'DROP TABLE {table}_search')
+
+
+VENDORS = {
+    'postgresql': (postgresql_forwards, postgresql_backwards),
+    'sqlite': (sqlite_forwards, sqlite_backwards),
+}
+
+
+def forwards(apps, schema_editor):
+    if schema_editor.connection.vendor in VENDORS:
+        apply, _ = VENDORS[schema_editor.connection.vendor]
+        for table, columns in SEARCHED.items():
+            apply(schema_editor, table, columns)
+
+
+def backwards(apps, schema_editor):
+    if schema_editor.connection.vendor in VENDORS:
+        _, revert = VENDORS[schema_editor.connection.vendor]
+        for table, columns in SEARCHED.items():
+            revert(schema_editor, table, columns)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
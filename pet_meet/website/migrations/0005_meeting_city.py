@@ -0,0 +1,31 @@
+# Generated by Django 4.2.6 on 2026-10-17 19:54
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_city(apps, schema_editor):
+    Group = apps.get_model('website', 'Group')
+    Meeting = apps.get_model('website', 'Meeting')
+
+    Meeting.objects.update(city=Subquery(Group.objects.filter(pk=OuterRef('group_id')).values('city')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0004_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meeting',
+            name='city',
+            field=models.CharField(default='', max_length=80),
+        ),
+        migrations.RunPython(populate_city, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='meeting',
+            index=models.Index(fields=['city', 'time', 'id'], name='meeting_city_time_idx'),
+        ),
+    ]
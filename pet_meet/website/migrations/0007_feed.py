@@ -0,0 +1,59 @@
+# Generated by Django 4.2.6 on 2026-10-17 20:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# the columns indexed by website_group_search (see 0004_search)
+GROUP_SEARCHED = ('name', 'city')
+
+
+def sqlite_triggers(schema_editor, table, columns):
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    delete = f"INSERT INTO {table}_search ({table}_search, rowid, {names}) VALUES ('delete', old.id, {old});"
+    insert = f'INSERT INTO {table}_search (rowid, {names}) VALUES (new.id, {new});'
+    schema_editor.execute(f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN {insert} END')
+    schema_editor.execute(f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN {delete} END')
+    schema_editor.execute(f'CREATE TRIGGER {table}_search_update AFTER UPDATE ON {table} BEGIN {delete} {insert} END')
+
+
+def recreate_group_triggers(apps, schema_editor):
+    # SQLite adds or removes the column by remaking website_group, which drops its search triggers
+    if schema_editor.connection.vendor == 'sqlite':
+        table = 'website_group'
+        for trigger in ('insert', 'delete', 'update'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_{trigger}')
+        sqlite_triggers(schema_editor, table, GROUP_SEARCHED)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0006_tokenuser'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_group_triggers),
+        migrations.AddField(
+            model_name='group',
+            name='fanout_on_read',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('post', 'post'), ('meeting', 'meeting')], max_length=7)),
+                ('object_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at', 'kind', 'object_id'], name='feed_user_created_idx')],
+            },
+        ),
+        migrations.RunPython(recreate_group_triggers, migrations.RunPython.noop),
+    ]
@@ -4,9 +4,33 @@ from django.contrib.auth.models import (
 )
 
 
+class CounterFieldsMixin:
+    """
+    Leaves the denormalized `counter_fields`, and the `internal_fields` set
+    with .update(), out of ordinary saves, so saving an instance loaded
+    earlier in the request doesn't overwrite changes made since by other
+    requests.
+    """
+    counter_fields = ()
+    internal_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            skipped = set(self.counter_fields) | set(self.internal_fields) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped and field.attname not in skipped
+            ]
+
+        super().save(*args, **kwargs)
+
+
 class User(AbstractBaseUser, PermissionsMixin):
     class Meta:
         ordering = ('created_at',)
+        indexes = (
+            models.Index(fields=('created_at',), name='user_created_idx'),
+        )
 
     username = None
     email = models.EmailField(null=False, unique=True)  # we dont want to have 2 users with the same email (unique=True)
@@ -28,15 +52,48 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
+
+
+class TokenUser(User):
+    """
+    The user of a request authenticated by the claims of its access token
+    (see website/authentication.py). Fields missing from the claims are
+    deferred and, on first access, all set at once from the cached user row.
+    """
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        from .authentication import get_user_values
+
+        values = get_user_values(self.pk) if fields is not None else None
+        if values is None:
+            return super().refresh_from_db(using, fields, **kwargs)
+
+        for attname in self.get_deferred_fields():
+            setattr(self, attname, values[attname])
   
 
-class Group(models.Model):
+class Group(CounterFieldsMixin, models.Model):
     class Meta:
         ordering = ('created_at',)
+        indexes = (
+            models.Index(fields=('city', 'created_at'), name='group_city_created_idx'),
+        )
 
     name = models.CharField(max_length=80, null=False)
     city = models.CharField(max_length=80, null=False)
 
+    # kept up to date by the views, see website/counters.py
+    post_count = models.PositiveIntegerField(default=0, null=False)
+    meeting_count = models.PositiveIntegerField(default=0, null=False)
+    upcoming_meeting_count = models.PositiveIntegerField(default=0, null=False)
+    counter_fields = ('post_count', 'meeting_count', 'upcoming_meeting_count')
+
+    # set once the group has too many participants to copy its posts and meetings into their feeds, see website/feed.py
+    fanout_on_read = models.BooleanField(default=False, null=False)
+    internal_fields = ('fanout_on_read',)
+
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
@@ -46,28 +103,46 @@ class Group(models.Model):
         return self.name
 
 
-class Meeting(models.Model):
+class Meeting(CounterFieldsMixin, models.Model):
     class Meta:
         ordering = ('created_at',)
+        indexes = (
+            models.Index(fields=('group', 'created_at', 'id'), name='meeting_group_created_idx'),
+            models.Index(fields=('group', 'time'), name='meeting_group_time_idx'),
+            models.Index(fields=('city', 'time', 'id'), name='meeting_city_time_idx'),
+        )
 
     title = models.CharField(max_length=80, null=False)
     location = models.CharField(max_length=100, null=False)
     time = models.DateTimeField(null=False)
+    city = models.CharField(max_length=80, null=False, default='')  # the group's, copied so meetings can be found by city and time
+
+    attendee_count = models.PositiveIntegerField(default=0, null=False)  # kept up to date by the views, see website/counters.py
+    counter_fields = ('attendee_count',)
 
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
-    group = models.ForeignKey(Group, related_name='meetings', on_delete=models.CASCADE, null=False)
+    group = models.ForeignKey(Group, related_name='meetings', on_delete=models.CASCADE, null=False, db_index=False)  # covered by meeting_group_created_idx
     creator = models.ForeignKey(User, related_name='created_meetings', on_delete=models.CASCADE, null=False)
     attendees = models.ManyToManyField(User, related_name='attending_meetings')
 
     def __str__(self):
         return f'{self.title} {self.location} {self.time}'
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.city:
+            self.city = self.group.city
+
+        super().save(*args, **kwargs)
+
 
 class Post(models.Model):
     class Meta:
         ordering = ('created_at',)
+        indexes = (
+            models.Index(fields=('group', 'created_at', 'id'), name='post_group_created_idx'),
+        )
 
     title = models.CharField(max_length=80, null=False)
     text = models.TextField(null=False)
@@ -76,7 +151,7 @@ class Post(models.Model):
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
     user = models.ForeignKey(User, related_name='posts', on_delete=models.CASCADE, null=False)
-    group = models.ForeignKey(Group, related_name='posts', on_delete=models.CASCADE, null=False)
+    group = models.ForeignKey(Group, related_name='posts', on_delete=models.CASCADE, null=False, db_index=False)  # covered by post_group_created_idx
 
     def __str__(self):
         return f'"{self.title}" - {self.user}'
@@ -85,6 +160,9 @@ class Post(models.Model):
 class Comment(models.Model):
     class Meta:
         ordering = ('created_at',)
+        indexes = (
+            models.Index(fields=('post', 'created_at', 'id'), name='comment_post_created_idx'),
+        )
 
     text = models.TextField(null=False)
     rating = models.CharField(
@@ -102,7 +180,7 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
-    post = models.ForeignKey(Post, related_name='comments', on_delete=models.CASCADE, null=True)
+    post = models.ForeignKey(Post, related_name='comments', on_delete=models.CASCADE, null=True, db_index=False)  # covered by comment_post_created_idx
     user = models.ForeignKey(User, related_name='comments', on_delete=models.CASCADE, null=True)
 
     def __str__(self):
@@ -112,6 +190,9 @@ class Comment(models.Model):
 class Animal(models.Model):
     class Meta:
         ordering = ('created_at',)
+        indexes = (
+            models.Index(fields=('user', 'created_at', 'id'), name='animal_user_created_idx'),
+        )
 
     name = models.CharField(max_length=50, null=False)
     breed = models.CharField(max_length=80, null=True)
@@ -127,7 +208,19 @@ class Animal(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
-    user = models.ForeignKey(User, related_name='animals', on_delete=models.CASCADE, null=False)
-
+    user = models.ForeignKey(User, related_name='animals', on_delete=models.CASCADE, null=False, db_index=False)  # covered by animal_user_created_idx
 
 
+class FeedEntry(models.Model):
+    """
+    A post or meeting in the feed of a user, see website/feed.py.
+    """
+    class Meta:
+        indexes = (
+            models.Index(fields=('user', 'created_at', 'kind', 'object_id'), name='feed_user_created_idx'),
+        )
+
+    user = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE, null=False, db_index=False)  # covered by feed_user_created_idx
+    kind = models.CharField(max_length=7, choices=(('post', 'post'), ('meeting', 'meeting')), null=False)
+    object_id = models.BigIntegerField(null=False)
+    created_at = models.DateTimeField(null=False)  # of the post or meeting
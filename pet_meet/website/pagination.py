@@ -0,0 +1,198 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def parse_page_size(value, cutoff):
+    page_size = int(value)
+    if page_size <= 0:
+        raise ValueError
+
+    return min(page_size, cutoff)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on the `ordering` columns (by default the
+    models' `created_at` with `id` as a tie breaker).
+
+    Pages are read with a range condition on the ordering columns instead of
+    an OFFSET and no total count is computed, so a deep page costs the same
+    as the first one. Cursors are opaque to clients. NULLs of nullable
+    ordering columns sort after all values, as in PostgreSQL indexes.
+    """
+    ordering = ('created_at', 'id')
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.read_request(request, queryset)
+        return self.build_page(list(self.get_page_queryset(queryset)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        `paginate_queryset` reading the page with the async ORM.
+        """
+        self.read_request(request, queryset)
+        return self.build_page([row async for row in self.get_page_queryset(queryset)])
+
+    def read_request(self, request, queryset):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request, self.get_ordering_fields(queryset))
+
+    def get_ordering_fields(self, queryset):
+        """
+        The model fields of the ordering columns, used to parse cursors.
+        """
+        return [queryset.model._meta.get_field(name) for name in self.ordering]
+
+    def get_page_queryset(self, queryset):
+        """
+        The query for the requested page: one row more than the page size,
+        so the existence of a following page is known without counting.
+        """
+        nullable = [name for name, field in zip(self.ordering, self.get_ordering_fields(queryset)) if field.null]
+        if self.cursor is None:
+            return queryset.order_by(*self.get_order_by(False, nullable))[:self.page_size + 1]
+
+        reverse, position = self.cursor
+        queryset = queryset.filter(self.get_position_filter(position, reverse, nullable))
+        return queryset.order_by(*self.get_order_by(reverse, nullable))[:self.page_size + 1]
+
+    def get_order_by(self, reverse, nullable=()):
+        # the order of an index scan, forwards or backwards
+        if reverse:
+            return [F(name).desc(nulls_first=True) if name in nullable else f'-{name}' for name in self.ordering]
+
+        return [F(name).asc(nulls_last=True) if name in nullable else name for name in self.ordering]
+
+    def get_position_filter(self, position, reverse, nullable=()):
+        """
+        The rows after `position` in the ordering, before it when `reverse`.
+        """
+        condition = Q()
+        for i, name in enumerate(self.ordering):
+            equal = [
+                Q(**{f'{previous}__isnull': True}) if value is None else Q(**{previous: value})
+                for previous, value in zip(self.ordering[:i], position[:i])
+            ]
+            condition |= Q(*equal, self.get_column_filter(name, position[i], reverse, name in nullable))
+
+        # leading column bound, so the database can range scan the index
+        first, value = self.ordering[0], position[0]
+        if value is None:
+            bound = Q() if reverse else Q(**{f'{first}__isnull': True})
+        elif reverse:
+            bound = Q(**{f'{first}__lte': value})
+        else:
+            bound = Q(**{f'{first}__gte': value})
+            if first in nullable:
+                bound |= Q(**{f'{first}__isnull': True})
+
+        return bound & condition
+
+    def get_column_filter(self, name, value, reverse, nullable):
+        if value is None:
+            # NULL sorts last
+            return Q(**{f'{name}__isnull': False}) if reverse else Q(pk__in=[])
+        if reverse:
+            return Q(**{f'{name}__lt': value})
+        if nullable:
+            return Q(**{f'{name}__gt': value}) | Q(**{f'{name}__isnull': True})
+
+        return Q(**{f'{name}__gt': value})
+
+    def build_page(self, rows):
+        reverse = self.cursor is not None and self.cursor[0]
+        has_more = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        if reverse:
+            page.reverse()
+
+        self.next_position = None
+        self.previous_position = None
+        if page:
+            if has_more or reverse:
+                self.next_position = self.get_position(page[-1])
+            if (has_more and reverse) or (self.cursor is not None and not reverse):
+                self.previous_position = self.get_position(page[0])
+        elif self.cursor is not None:
+            if reverse:
+                self.next_position = self.cursor[1]
+            else:
+                self.previous_position = self.cursor[1]
+
+        return page
+
+    def get_position(self, row):
+        if isinstance(row, dict):
+            return [row[name] for name in self.ordering]
+
+        return [getattr(row, name) for name in self.ordering]
+
+    def get_page_size(self, request):
+        try:
+            return parse_page_size(request.query_params[self.page_size_query_param], self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request, fields):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            reverse, values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if len(values) != len(fields):
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(fields, values)]
+        except (TypeError, ValueError, UnicodeEncodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return bool(reverse), position
+
+    def encode_cursor(self, position, reverse):
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in position]
+        encoded = base64.urlsafe_b64encode(json.dumps([int(reverse), values]).encode('ascii'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,105 @@
+"""
+Sampling profiler for individual requests, writing collapsed stacks to
+PROFILER_DIRECTORY (see `website.middleware.ProfilingMiddleware`).
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+
+HEADER = 'HTTP_X_PROFILE'
+TOKEN_SALT = 'website.profiling'
+
+# the first matching module prefix, from the innermost frame out, names the part
+CATEGORIES = (
+    ('django.db.', 'orm'),
+    ('rest_framework.renderers', 'render'),
+    ('json.', 'render'),
+    ('website.serializers', 'serializer'),
+    ('website.values', 'serializer'),
+    ('rest_framework.serializers', 'serializer'),
+    ('rest_framework.fields', 'serializer'),
+    ('rest_framework.relations', 'serializer'),
+)
+
+
+def make_token():
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign('profile')
+
+
+def has_valid_token(request):
+    token = request.META.get(HEADER)
+    if not token:
+        return False
+
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=settings.PROFILER_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+
+    return True
+
+
+def _frame_name(frame):
+    return f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}'
+
+
+def _categorize(stack):
+    for name in reversed(stack):
+        for prefix, category in CATEGORIES:
+            if name.startswith(prefix):
+                return category
+
+    return 'view'
+
+
+class Sampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def get_breakdown(self):
+        breakdown = Counter()
+        for stack, count in self.stacks.items():
+            breakdown[_categorize(stack)] += count
+
+        return dict(breakdown)
+
+    def write(self, name):
+        directory = settings.PROFILER_DIRECTORY
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{time.time_ns() % 10 ** 9}-{name}.collapsed')
+        with open(path, 'w') as output:
+            for stack, count in sorted(self.stacks.items()):
+                output.write(f'{";".join(stack)} {count}\n')
+
+        return path
+
+
+def start():
+    sampler = Sampler(threading.get_ident(), settings.PROFILER_INTERVAL)
+    sampler.start()
+    return sampler
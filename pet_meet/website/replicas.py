@@ -0,0 +1,204 @@
+"""
+Read replicas: reads of GET, HEAD and OPTIONS requests go to a healthy
+DATABASE_REPLICAS member, everything else to the primary.
+"""
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import TokenUserAuthentication
+
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# cache backends private to a process, whose sticky markers other workers don't see
+PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+_current = ContextVar('routing', default=None)
+_turn = itertools.count()
+# alias: time until which the replica is ejected
+_ejected = {}
+# alias: time of its last lag check
+_checked = {}
+_health_lock = threading.Lock()
+
+
+class Routing:
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.alias = None
+
+    def get_read_alias(self):
+        if not self.use_replicas:
+            return DEFAULT_DB_ALIAS
+        if self.alias is None:
+            self.alias = pick_replica()
+
+        return self.alias
+
+
+@contextmanager
+def routing(use_replicas):
+    token = _current.set(Routing(use_replicas))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def primary():
+    """
+    Reads in the block go to the primary.
+    """
+    with routing(False):
+        yield
+
+
+def pick_replica():
+    replicas = settings.DATABASE_REPLICAS
+    start = next(_turn)
+    for i in range(len(replicas)):
+        alias = replicas[(start + i) % len(replicas)]
+        if is_healthy(alias):
+            return alias
+
+    return DEFAULT_DB_ALIAS
+
+
+def eject(alias, reason):
+    logger.warning('replica=%s ejected for %ss: %s', alias, settings.REPLICA_EJECT_SECONDS, reason)
+    with _health_lock:
+        _ejected[alias] = time.monotonic() + settings.REPLICA_EJECT_SECONDS
+
+
+def is_healthy(alias):
+    now = time.monotonic()
+    with _health_lock:
+        if _ejected.get(alias, 0) > now:
+            return False
+        check_lag = now - _checked.get(alias, float('-inf')) >= settings.REPLICA_CHECK_INTERVAL
+        if check_lag:
+            _checked[alias] = now
+
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        lag = get_lag(connection) if check_lag else None
+    except DatabaseError as error:
+        eject(alias, error)
+        return False
+
+    if lag is not None and lag > settings.REPLICA_MAX_LAG:
+        eject(alias, f'{lag:.1f}s behind')
+        return False
+
+    return True
+
+
+def get_lag(connection):
+    """
+    Seconds since the last transaction replayed by a PostgreSQL standby,
+    None when unknown.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT CASE WHEN pg_is_in_recovery() '
+            'THEN extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END'
+        )
+        lag, = cursor.fetchone()
+
+    return float(lag) if lag is not None else None
+
+
+def _sticky_key(user_id):
+    return f'replicas:primary:{user_id}'
+
+
+def get_token_user_id(request):
+    """
+    The id of the user of the request's access token, without a query.
+    """
+    authentication = TokenUserAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return None
+
+    try:
+        return authentication.get_validated_token(raw_token).get(api_settings.USER_ID_CLAIM)
+    except (InvalidToken, TokenError):
+        return None
+
+
+@checks.register(checks.Tags.caches)
+def check_sticky_cache(app_configs, **kwargs):
+    """
+    Read your writes needs the sticky markers in a cache shared by the worker
+    processes.
+    """
+    backend = settings.CACHES.get(settings.RESPONSE_CACHE_ALIAS, {}).get('BACKEND')
+    if not settings.DATABASE_REPLICAS or backend not in PROCESS_CACHES:
+        return []
+
+    return [checks.Warning(
+        f'RESPONSE_CACHE_ALIAS uses {backend}, so a user only reads their own writes from '
+        'requests served by the worker process that made them.',
+        hint='Use a cache shared by the worker processes (memcached, redis, the file-based cache ...).',
+        id='website.W001',
+    )]
+
+
+def uses_replicas(request):
+    if not settings.DATABASE_REPLICAS or request.method not in SAFE_METHODS:
+        return False
+
+    user_id = get_token_user_id(request)
+    return user_id is None or not caches[settings.RESPONSE_CACHE_ALIAS].get(_sticky_key(user_id))
+
+
+def wrote(request, response):
+    """
+    Keeps the user of a successful write reading from the primary for
+    REPLICA_STICKY_SECONDS.
+    """
+    if not settings.DATABASE_REPLICAS or request.method in SAFE_METHODS or response.status_code >= 400:
+        return
+
+    # set by DRF on the Django request once authenticated
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        caches[settings.RESPONSE_CACHE_ALIAS].set(_sticky_key(user.pk), True, timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        current = _current.get()
+        return current.get_read_alias() if current is not None else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
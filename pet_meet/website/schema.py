@@ -0,0 +1,92 @@
+"""
+API documentation: Swagger UI, ReDoc and the OpenAPI schema they display,
+with drf_yasg imported on the first request to one of them.
+"""
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework import permissions
+
+
+def get_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="Snippets API",
+        default_version='v1',
+        description="Test description",
+        terms_of_service="https://www.google.com/policies/terms/",
+        contact=openapi.Contact(email="contact@snippets.local"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_schema_view():
+    from drf_yasg.views import get_schema_view
+
+    return get_schema_view(
+        get_info(),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_view(ui=None):
+    if ui is None:
+        return get_schema_view().without_ui(cache_timeout=0)
+
+    return get_schema_view().with_ui(ui, cache_timeout=0)
+
+
+def lazy_view(ui=None):
+    """
+    A view for `urlpatterns` serving the schema (`ui` None) or a UI for it,
+    importing drf_yasg on its first request.
+    """
+    def view(request, *args, **kwargs):
+        return get_view(ui)(request, *args, **kwargs)
+
+    return view
+
+
+def generate():
+    """
+    The OpenAPI schema of the API as JSON.
+    """
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    schema = OpenAPISchemaGenerator(get_info()).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[], pretty=True).encode(schema)
+
+
+@lru_cache(maxsize=1)
+def read_schema_file(path, modified):
+    return Path(path).read_bytes()
+
+
+def get_schema_file():
+    """
+    The content of SCHEMA_FILE, None when it doesn't exist or in DEBUG mode.
+    """
+    path = Path(settings.SCHEMA_FILE)
+    if settings.DEBUG or not path.exists():
+        return None
+
+    return read_schema_file(str(path), path.stat().st_mtime)
+
+
+@require_safe
+def schema_file(request):
+    content = get_schema_file()
+    if content is None:
+        return get_view()(request, format='.json')
+
+    response = HttpResponse(content, content_type='application/json')
+    response['Cache-Control'] = f'public, max-age={settings.SCHEMA_CACHE_TIMEOUT}'
+    return response
@@ -0,0 +1,120 @@
+"""
+Full-text search over posts, comments and groups, with the indexes created by
+migration 0004_search (tsvector on Postgres, FTS5 on SQLite).
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, CharField, FloatField, IntegerField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Group, Post, Comment
+from .pagination import KeysetPagination
+from .serializers import CommentIndexSerializer, GroupIndexSerializer, PostIndexSerializer
+
+
+# kind: (model, serializer, searched fields), the fields are also listed in migration 0004_search
+SEARCHED = {
+    'post': (Post, PostIndexSerializer, ('title', 'text')),
+    'comment': (Comment, CommentIndexSerializer, ('text',)),
+    'group': (Group, GroupIndexSerializer, ('name', 'city')),
+}
+
+
+def get_terms(text):
+    return re.findall(r'\w+', text)
+
+
+def _postgresql(model, fields, text):
+    vector = f'{connection.ops.quote_name(model._meta.db_table)}.search_vector'
+    query = "websearch_to_tsquery('simple', %s)"
+    return model.objects.filter(
+        RawSQL(f'{vector} @@ {query}', [text], output_field=BooleanField())
+    ).annotate(
+        rank=RawSQL(f'-ts_rank({vector}, {query})::float8', [text], output_field=FloatField())
+    )
+
+
+def _fallback(model, fields, text):
+    condition = Q()
+    for term in get_terms(text):
+        condition &= Q(*[Q(**{f'{field}__icontains': term}) for field in fields], _connector=Q.OR)
+    return model.objects.filter(condition).annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+def _branch(kind, model, fields, text):
+    """
+    SQL selecting the `id`, `kind` and `rank` of the `model` rows matching `text`.
+    """
+    if connection.vendor == 'sqlite':
+        # read from the FTS5 table itself, its `rank` is the bm25 score of the match
+        table = f'{model._meta.db_table}_search'
+        # every term quoted, so user input can't be read as FTS5 query syntax
+        match = ' '.join(f'"{term}"' for term in get_terms(text))
+        return f'SELECT rowid AS id, %s AS kind, rank FROM {table} WHERE {table} MATCH %s', [kind, match]
+
+    queryset = _postgresql(model, fields, text) if connection.vendor == 'postgresql' else _fallback(model, fields, text)
+    queryset = queryset.annotate(kind=Value(kind, output_field=CharField())).order_by().values('id', 'kind', 'rank')
+    return queryset.query.sql_with_params()
+
+
+def search(text, kinds=None):
+    """
+    (sql, params) of a query selecting the `id`, `kind` and `rank` of the
+    rows of every searched model (or of `kinds`) matching `text`.
+    """
+    branches = [
+        _branch(kind, model, fields, text)
+        for kind, (model, _, fields) in SEARCHED.items()
+        if not kinds or kind in kinds
+    ]
+    return ' UNION ALL '.join(sql for sql, _ in branches), [param for _, params in branches for param in params]
+
+
+def load_results(rows):
+    """
+    The serialized objects of the result `rows`, one query per kind.
+    """
+    ids = {}
+    for row in rows:
+        ids.setdefault(row['kind'], []).append(row['id'])
+
+    objects = {}
+    for kind, kind_ids in ids.items():
+        model, serializer_class, _ = SEARCHED[kind]
+        queryset = serializer_class.setup_eager_loading(model.objects.filter(id__in=kind_ids))
+        for data in serializer_class(queryset, many=True).data:
+            objects[kind, data['id']] = data
+
+    return [
+        {'type': row['kind'], 'rank': row['rank'], 'object': objects[row['kind'], row['id']]}
+        for row in rows if (row['kind'], row['id']) in objects
+    ]
+
+
+class SearchPagination(KeysetPagination):
+    """
+    Keyset pagination over the rows of a `search()` query.
+    """
+    ordering = ('rank', 'kind', 'id')
+
+    def get_ordering_fields(self, query):
+        return [FloatField(), CharField(), IntegerField()]
+
+    def get_page_queryset(self, query):
+        sql, params = query
+        columns = ', '.join(connection.ops.quote_name(name) for name in self.ordering)
+        reverse = self.cursor is not None and self.cursor[0]
+        where = ''
+        if self.cursor is not None:
+            where = f'WHERE ({columns}) {"<" if reverse else ">"} (%s, %s, %s)'
+            params = [*params, *self.cursor[1]]
+
+        direction = ' DESC' if reverse else ''
+        ordering = ', '.join(connection.ops.quote_name(name) + direction for name in self.ordering)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {columns} FROM ({sql}) results {where} ORDER BY {ordering} LIMIT %s',
+                [*params, self.page_size + 1]
+            )
+            return [dict(zip(self.ordering, row)) for row in cursor.fetchall()]
@@ -1,9 +1,206 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import reverse
 from rest_framework import serializers
 
+from . import instrumentation
 from .models import User, Meeting, Group, Post, Comment, Animal
 
 
-class UserNestedSerializer(serializers.ModelSerializer):
+PREVIEW_SIZE = 5
+
+
+class EagerLoadingMixin:
+    """
+    Lets a serializer declare the relations it renders, so views can load
+    them together with the rows instead of issuing a query per row.
+
+    `select_related_fields` lists forward foreign keys, `prefetch_related_fields`
+    lists to-many relations. Relations needed by nested serializers and by
+    `PreviewField`s are picked up automatically.
+
+    Serializers take an optional `fields` selection (the names to render,
+    all of them by default) and `expand`, the `expandable_fields` to render
+    as well, which are left out by default. Given the same selection,
+    `setup_eager_loading` only joins and prefetches the selected relations
+    and, when `fields` is given, only loads the columns they read.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    expandable_fields = ()
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        self.selected_fields = fields
+        self.expanded_fields = expand
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        return {
+            name: field for name, field in super().get_fields().items()
+            if self.is_selected(name, self.selected_fields, self.expanded_fields)
+        }
+
+    @classmethod
+    def is_selected(cls, name, fields=None, expand=()):
+        if name in cls.expandable_fields:
+            return name in expand
+
+        return fields is None or name in fields
+
+    @classmethod
+    def get_select_related(cls, fields=None, expand=()):
+        lookups = []
+        for name in cls.select_related_fields:
+            if not cls.is_selected(name, fields, expand):
+                continue
+            lookups.append(name)
+            nested = cls._declared_fields.get(name)
+            if isinstance(nested, EagerLoadingMixin):
+                lookups += [f'{name}__{lookup}' for lookup in nested.get_select_related()]
+
+        return lookups
+
+    @classmethod
+    def get_prefetch_related(cls, fields=None, expand=()):
+        prefetches = []
+        for name in cls.prefetch_related_fields:
+            if not cls.is_selected(name, fields, expand):
+                continue
+            queryset = cls.Meta.model._meta.get_field(name).related_model.objects.all()
+            nested = cls._declared_fields[name].child
+            if isinstance(nested, EagerLoadingMixin):
+                queryset = nested.setup_eager_loading(queryset)
+            prefetches.append(Prefetch(name, queryset=queryset))
+
+        for name, field in cls.get_preview_fields(fields, expand):
+            # a sliced prefetch is limited per parent row in SQL (ROW_NUMBER() OVER ...)
+            queryset = field.get_related_model(cls.Meta.model, name).objects.order_by('-created_at', '-id')
+            queryset = field.serializer_class.setup_eager_loading(queryset)[:PREVIEW_SIZE]
+            prefetches.append(Prefetch(field.source or name, queryset=queryset, to_attr=f'recent_{name}'))
+
+        return prefetches
+
+    @classmethod
+    def get_preview_fields(cls, fields=None, expand=()):
+        return [
+            (name, field) for name, field in cls._declared_fields.items()
+            if isinstance(field, PreviewField) and cls.is_selected(name, fields, expand)
+        ]
+
+    def get_loaded_columns(self):
+        """
+        The lookups of the columns the rendered fields read, joined relations
+        included, for `.only()`.
+        """
+        model = self.Meta.model
+        lookups = []
+        for field in self.fields.values():
+            if isinstance(field, PreviewField):
+                if field.count_field is not None:
+                    lookups.append(field.count_field)
+                continue
+
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                continue
+            if not model_field.concrete or model_field.many_to_many:
+                continue
+
+            lookups.append(model_field.name)
+            if isinstance(field, EagerLoadingMixin) and field.field_name in self.select_related_fields:
+                lookups += [f'{model_field.name}__{lookup}' for lookup in field.get_loaded_columns()]
+
+        return lookups
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, expand=(), extra_columns=()):
+        """
+        `queryset` loading what the serializer renders with the given
+        selection, and `extra_columns` (such as the ones a paginator orders
+        by) when the columns are limited.
+        """
+        select_related = cls.get_select_related(fields, expand)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+
+        prefetch_related = cls.get_prefetch_related(fields, expand)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+
+        counts = {
+            f'{name}_count': field.get_count_expression(cls.Meta.model, name)
+            for name, field in cls.get_preview_fields(fields, expand)
+            if field.count_field is None
+        }
+        if counts:
+            queryset = queryset.annotate(**counts)
+
+        if fields is not None:
+            columns = cls(fields=fields, expand=expand).get_loaded_columns()
+            queryset = queryset.only(*columns, *extra_columns)
+
+        return queryset
+
+    def to_representation(self, instance):
+        with instrumentation.timed('serialize'):
+            return super().to_representation(instance)
+
+
+class PreviewField(serializers.Field):
+    """
+    Renders a to-many relation as its PREVIEW_SIZE most recent rows, the total
+    count and a link to the endpoint paging through all of them, so a detail
+    response stays the same size however big the relation grows.
+
+    The count comes from the denormalized `count_field` of the instance when
+    there is one, otherwise from an annotation added by `setup_eager_loading`.
+    """
+    def __init__(self, serializer_class, url_name, url_kwarg, count_field=None, **kwargs):
+        self.serializer_class = serializer_class
+        self.url_name = url_name
+        self.url_kwarg = url_kwarg
+        self.count_field = count_field
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_related_model(self, model, name):
+        return model._meta.get_field(self.source or name).related_model
+
+    def get_count_expression(self, model, name):
+        relation = model._meta.get_field(self.source or name)
+        lookup = relation.field.name
+        return Coalesce(
+            Subquery(
+                relation.related_model.objects.filter(**{lookup: OuterRef('pk')})
+                .order_by().values(lookup).annotate(count=Count('pk')).values('count')
+            ),
+            0
+        )
+
+    def get_attribute(self, instance):
+        return instance
+
+    def to_representation(self, instance):
+        related = getattr(instance, self.source)
+        items = getattr(instance, f'recent_{self.field_name}', None)
+        if items is None:
+            queryset = related.order_by('-created_at', '-id')
+            items = self.serializer_class.setup_eager_loading(queryset)[:PREVIEW_SIZE]
+
+        count = getattr(instance, self.count_field or f'{self.field_name}_count', None)
+        if count is None:
+            count = related.count()
+
+        return {
+            'count': count,
+            'url': reverse(self.url_name, kwargs={self.url_kwarg: instance.pk}),
+            'results': self.serializer_class(items, many=True).data
+        }
+
+
+class UserNestedSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = (
@@ -14,8 +211,11 @@ class UserNestedSerializer(serializers.ModelSerializer):
         )
 
 
-class GroupNestedSerializer(serializers.ModelSerializer):
+class GroupNestedSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     creator = UserNestedSerializer(read_only=True)
+
+    select_related_fields = ('creator',)
+
     class Meta:
         model = Group
         fields = (
@@ -26,9 +226,11 @@ class GroupNestedSerializer(serializers.ModelSerializer):
         )
 
 
-class MeetingNestedSerializer(serializers.ModelSerializer):
+class MeetingNestedSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     creator = UserNestedSerializer(read_only=True)
 
+    select_related_fields = ('creator',)
+
     class Meta:
         model = Meeting
         fields = (
@@ -40,9 +242,11 @@ class MeetingNestedSerializer(serializers.ModelSerializer):
         )
 
 
-class PostNestedSerializer(serializers.ModelSerializer):
+class PostNestedSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     user = UserNestedSerializer(read_only=True)
 
+    select_related_fields = ('user',)
+
     class Meta:
         model = Post
         fields = (
@@ -52,9 +256,11 @@ class PostNestedSerializer(serializers.ModelSerializer):
         )
 
 
-class CommentNestedSerializer(serializers.ModelSerializer):
+class CommentNestedSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     user = UserNestedSerializer(read_only=True)
 
+    select_related_fields = ('user',)
+
     class Meta:
         model = Comment
         fields = (
@@ -65,7 +271,7 @@ class CommentNestedSerializer(serializers.ModelSerializer):
         )
 
 
-class AnimalNestedSerializer(serializers.ModelSerializer):
+class AnimalNestedSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Animal
         fields = (
@@ -76,7 +282,7 @@ class AnimalNestedSerializer(serializers.ModelSerializer):
         )
 
 
-class UserIndexSerializer(serializers.ModelSerializer):
+class UserIndexSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ( 
@@ -87,10 +293,10 @@ class UserIndexSerializer(serializers.ModelSerializer):
         )
 
 
-class UserDetailSerializer(serializers.ModelSerializer):
-    animals = AnimalNestedSerializer(many=True, read_only=True)
-    created_groups = GroupNestedSerializer(many=True, read_only=True)
-    attending_meetings = MeetingNestedSerializer(many=True, read_only=True)
+class UserDetailSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    animals = PreviewField(AnimalNestedSerializer, 'user-animals', 'user_id')
+    created_groups = PreviewField(GroupNestedSerializer, 'user-groups', 'user_id')
+    attending_meetings = PreviewField(MeetingNestedSerializer, 'user-meetings', 'user_id')
 
     class Meta:
         model = User
@@ -111,31 +317,43 @@ class UserDetailSerializer(serializers.ModelSerializer):
         )
 
 
-class GroupIndexSerializer(serializers.ModelSerializer):
+class GroupIndexSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     creator = UserNestedSerializer(read_only=True)
 
+    select_related_fields = ('creator',)
+
     class Meta:
         model = Group
         fields = (
             'id',
             'name',
             'creator',
-            'city'
+            'city',
+            'post_count',
+            'meeting_count',
+            'upcoming_meeting_count'
         )
 
 
-class GroupDetailSerializer(serializers.ModelSerializer):
+class GroupDetailSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     creator = UserNestedSerializer(read_only=True)
-    posts = PostNestedSerializer(many=True, read_only=True)
-    meetings = MeetingNestedSerializer(many=True, read_only=True)
+    posts = PreviewField(PostNestedSerializer, 'group-posts', 'group_id', count_field='post_count')
+    meetings = PreviewField(MeetingNestedSerializer, 'group-meetings', 'group_id', count_field='meeting_count')
+
+    select_related_fields = ('creator',)
 
     class Meta:
         model = Group
-        fields = '__all__'
+        exclude = ('fanout_on_read',)
+        read_only_fields = ('post_count', 'meeting_count', 'upcoming_meeting_count')
 
 
-class MeetingIndexSerializer(serializers.ModelSerializer):
+class MeetingIndexSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     creator = UserNestedSerializer(read_only=True)
+    group = GroupNestedSerializer(read_only=True)
+
+    select_related_fields = ('creator', 'group')
+    expandable_fields = ('group',)
 
     class Meta:
         model = Meeting
@@ -143,22 +361,51 @@ class MeetingIndexSerializer(serializers.ModelSerializer):
             'title',
             'time',
             'location',
-            'creator'
+            'creator',
+            'group',
+            'attendee_count'
         )
 
 
-class MeetingDetailSerializer(serializers.ModelSerializer):
+class MeetingUpcomingSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    creator = UserNestedSerializer(read_only=True)
+
+    select_related_fields = ('creator',)
+
+    class Meta:
+        model = Meeting
+        fields = (
+            'id',
+            'title',
+            'time',
+            'location',
+            'city',
+            'group',
+            'creator',
+            'attendee_count'
+        )
+
+
+class MeetingDetailSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     creator = UserNestedSerializer(read_only=True)
     attendees = UserNestedSerializer(many=True, read_only=True)
     group = GroupNestedSerializer(read_only=True)
 
+    select_related_fields = ('creator', 'group')
+    prefetch_related_fields = ('attendees',)
+
     class Meta:
         model = Meeting
         fields = '__all__'
+        read_only_fields = ('attendee_count', 'city')
 
 
-class PostIndexSerializer(serializers.ModelSerializer):
+class PostIndexSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     user = UserNestedSerializer(read_only=True)
+    group = GroupNestedSerializer(read_only=True)
+
+    select_related_fields = ('user', 'group')
+    expandable_fields = ('group',)
 
     class Meta:
         model = Post
@@ -166,22 +413,30 @@ class PostIndexSerializer(serializers.ModelSerializer):
             'id',
             'title',
             'text',
-            'user'
+            'user',
+            'group'
         )
 
 
-class PostDetailSerializer(serializers.ModelSerializer):
+class PostDetailSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     user = UserNestedSerializer(read_only=True)
     group = GroupNestedSerializer(read_only=True)
     comments = CommentNestedSerializer(many=True, read_only=True)
 
+    select_related_fields = ('user', 'group')
+    prefetch_related_fields = ('comments',)
+
     class Meta:
         model = Post
         fields = '__all__'
 
 
-class CommentIndexSerializer(serializers.ModelSerializer):
+class CommentIndexSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     user = UserNestedSerializer(read_only=True)
+    post = PostNestedSerializer(read_only=True)
+
+    select_related_fields = ('user', 'post')
+    expandable_fields = ('post',)
 
     class Meta:
         model = Comment
@@ -189,34 +444,45 @@ class CommentIndexSerializer(serializers.ModelSerializer):
             'id',
             'text',
             'rating',
-            'user'
+            'user',
+            'post'
         )
 
 
-class CommentDetailSerializer(serializers.ModelSerializer):
+class CommentDetailSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     user = UserNestedSerializer(read_only=True)
     group = GroupNestedSerializer(read_only=True)
     post = PostNestedSerializer(read_only=True)
 
+    select_related_fields = ('user', 'post')
+
     class Meta:
         model = Comment
         fields = '__all__'
 
 
-class AnimalIndexSerializer(serializers.ModelSerializer):
+class AnimalIndexSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    user = UserNestedSerializer(read_only=True)
+
+    select_related_fields = ('user',)
+    expandable_fields = ('user',)
+
     class Meta:
         model = Animal
         fields = (
             'id',
             'name',
             'breed',
-            'type'
+            'type',
+            'user'
         )
 
 
-class AnimalDetailSerializer(serializers.ModelSerializer):
+class AnimalDetailSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     user = UserNestedSerializer(read_only=True)
 
+    select_related_fields = ('user',)
+
     class Meta:
         model = Animal
         fields = '__all__'
\ No newline at end of file
@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import authentication, cache, discovery, feed
+from .models import User, Meeting, Group, Post, Comment, Animal
+from .serializers import UserNestedSerializer
+
+
+def get_embedding_user(user_id):
+    """
+    The cached responses embedding the user (UserNestedSerializer): the
+    groups, posts and meetings they created, posted, commented on or attend.
+    """
+    groups = Group.objects.filter(
+        Q(creator_id=user_id) | Q(posts__user_id=user_id) | Q(meetings__creator_id=user_id)
+    ).values_list('id', flat=True).distinct()
+    posts = Post.objects.filter(
+        Q(user_id=user_id) | Q(comments__user_id=user_id) | Q(group__creator_id=user_id)
+    ).values_list('id', flat=True).distinct()
+    attendees = Meeting.attendees.through.objects.filter(meeting__creator_id=user_id).values_list('user_id', flat=True).distinct()
+    return [(Group, pk) for pk in groups] + [(Post, pk) for pk in posts] + [(User, pk) for pk in attendees]
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        return
+
+    cache.invalidate((User, instance.pk))
+    transaction.on_commit(lambda: authentication.forget_user(instance.pk))
+    # not for last_login updates and the like
+    if update_fields is None or set(update_fields) & set(UserNestedSerializer.Meta.fields):
+        cache.invalidate(*get_embedding_user(instance.pk))
+        discovery.creator_changed(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # the instance's pk is cleared once the delete is done
+    pk = instance.pk
+    transaction.on_commit(lambda: authentication.forget_user(pk))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, created=False, **kwargs):
+    cache.invalidate((Group, instance.pk), (User, instance.creator_id))
+    if not created:
+        # embedded in the details of its posts
+        cache.invalidate(*[(Post, pk) for pk in Post.objects.filter(group_id=instance.pk).values_list('id', flat=True)])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, created=False, **kwargs):
+    cache.invalidate((Post, instance.pk), (Group, instance.group_id))
+    if created:
+        feed.published([instance])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    cache.invalidate((Post, instance.post_id))
+
+
+@receiver(post_save, sender=Meeting)
+@receiver(pre_delete, sender=Meeting)
+def meeting_changed(sender, instance, created=False, **kwargs):
+    cache.invalidate((Group, instance.group_id))
+    discovery.meeting_changed(instance)
+    if created:
+        feed.published([instance])
+    else:
+        # embedded in the profiles of its attendees, read before a delete removes them
+        cache.invalidate(*[(User, pk) for pk in instance.attendees.values_list('id', flat=True)])
+
+
+@receiver(m2m_changed, sender=Meeting.attendees.through)
+def attendees_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            cache.invalidate((User, instance.pk))
+    elif action == 'pre_clear':
+        cache.invalidate(*[(User, pk) for pk in instance.attendees.values_list('id', flat=True)])
+    elif action in ('post_add', 'post_remove'):
+        cache.invalidate(*[(User, pk) for pk in pk_set])
+
+
+@receiver(post_save, sender=Animal)
+@receiver(post_delete, sender=Animal)
+def animal_changed(sender, instance, **kwargs):
+    cache.invalidate((User, instance.user_id))
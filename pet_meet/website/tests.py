@@ -1,3 +1,1208 @@
-from django.test import TestCase
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from urllib.parse import parse_qsl
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import F
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import async_views, authentication, cache, database, discovery, feed, instrumentation, profiling, replicas, throttling, values, views
+from .counters import recompute_counters
+from .management.commands.benchmark import build_path, get_authorization, get_routes
+from .models import User, Meeting, Group, Post, Comment, Animal, FeedEntry
+from .permissions import IsSuperUser
+from .serializers import (
+    AnimalIndexSerializer, CommentIndexSerializer, GroupIndexSerializer,
+    MeetingIndexSerializer, PostIndexSerializer, UserIndexSerializer,
+    GroupDetailSerializer, MeetingDetailSerializer
+)
+
+
+def setUpModule():
+    # tests request some endpoints many times, ThrottleTests turns throttling back on
+    global throttling_disabled
+    throttling_disabled = override_settings(THROTTLE_ENABLED=False)
+    throttling_disabled.enable()
+
+
+def tearDownModule():
+    throttling_disabled.disable()
+
+
+def create_data(size=3):
+    users = [
+        User.objects.create(
+            email=f'user{i}@example.com', first_name=f'First {i}', last_name='Last', address_city='Almaty',
+            is_superuser=i == 0
+        )
+        for i in range(size)
+    ]
+    group = Group.objects.create(name='Dog walkers', city='Almaty', creator=users[0])
+    for i, user in enumerate(users):
+        post = Post.objects.create(title=f'Post {i}', text='Text', user=user, group=group)
+        Comment.objects.create(text='Comment', rating='5', post=post, user=user)
+        Comment.objects.create(text='Anonymous', rating='3', post=post, user=None)
+        meeting = Meeting.objects.create(
+            title=f'Meeting {i}', location='Park', time=timezone.now() + timedelta(days=i),
+            group=group, creator=user
+        )
+        meeting.attendees.add(*users)
+        Animal.objects.create(name=f'Rex {i}', type='dog', breed=None, user=users[0])
+
+    recompute_counters()
+    return users, group
+
+
+@override_settings(VALUES_SERIALIZATION=False)
+class EagerLoadingTests(TestCase):
+    def setUp(self):
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def test_group_index_loads_creators_with_the_page(self):
+        for i in range(10):
+            Group.objects.create(name=f'Group {i}', city='Almaty', creator=self.users[i % len(self.users)])
+
+        # ETag state, count and page
+        with self.assertNumQueries(3):
+            response = self.client.get('/groups/')
+        self.assertEqual(response.json()['count'], 11)
+        with self.assertNumQueries(3):
+            response = self.client.get('/groups/', {'city': 'Almaty', 'fields': 'name,creator'})
+        self.assertEqual(response.json()['results'][0]['creator']['email'], 'user0@example.com')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.users, self.group = create_data()
+        for i in range(3, 7):
+            Post.objects.create(title=f'Post {i}', text='Text', user=self.users[0], group=self.group)
+        self.url = f'/groups/{self.group.id}/posts/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def titles(self, page):
+        return [post['title'] for post in page['results']]
+
+    def test_next_and_previous_pages(self):
+        first = self.client.get(self.url, {'page_size': 3}).json()
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        third = self.client.get(second['next']).json()
+        self.assertEqual(self.titles(first) + self.titles(second) + self.titles(third), [f'Post {i}' for i in range(7)])
+        self.assertEqual(self.titles(third), ['Post 6'])
+        self.assertIsNone(third['next'])
+        self.assertEqual(self.client.get(third['previous']).json()['results'], second['results'])
+        self.assertEqual(self.client.get(second['previous']).json()['results'], first['results'])
+
+    def test_exact_page_boundary(self):
+        first = self.client.get(self.url, {'page_size': 7}).json()
+        self.assertEqual(len(first['results']), 7)
+        self.assertIsNone(first['next'])
+        self.assertEqual(len(self.client.get(self.url, {'page_size': 6}).json()['results']), 6)
+        self.assertEqual(len(self.client.get(self.url, {'page_size': 0}).json()['results']), 7)
+
+    def test_rows_without_created_at_are_paged_last(self):
+        post = Post.objects.create(title='Imported', text='Text', user=self.users[0], group=self.group)
+        Post.objects.filter(id=post.id).update(created_at=None)
+        seen = []
+        page = self.client.get(self.url, {'page_size': 3}).json()
+        while True:
+            seen += self.titles(page)
+            if page['next'] is None:
+                break
+            page = self.client.get(page['next']).json()
+
+        self.assertEqual(seen, [f'Post {i}' for i in range(7)] + ['Imported'])
+        self.assertEqual(self.titles(self.client.get(page['previous']).json()), ['Post 3', 'Post 4', 'Post 5'])
+
+        last = self.client.get(self.client.get(self.url, {'page_size': 7}).json()['next']).json()
+        self.assertEqual(self.titles(last), ['Imported'])
+        self.assertEqual(self.titles(self.client.get(last['previous']).json()), [f'Post {i}' for i in range(7)])
+
+    def test_tampered_cursors(self):
+        for cursor in ('not base64!', 'W1s=', 'WzAsIFsiZGF5IiwgMV1d', 'WzAsIFsxXV0='):
+            self.assertEqual(self.client.get(self.url, {'cursor': cursor}).status_code, 404, cursor)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def counts(self):
+        self.group.refresh_from_db()
+        return self.group.post_count, self.group.meeting_count, self.group.upcoming_meeting_count
+
+    def test_views_update_the_counters(self):
+        self.assertEqual(self.counts(), (3, 3, 2))
+        post = self.client.post(f'/groups/{self.group.id}/posts/', {'title': 'Walk', 'text': 'Text'}).json()
+        self.assertEqual(self.client.delete(f'/posts/{post["id"]}/').status_code, 204)
+        self.client.post(f'/groups/{self.group.id}/posts/', {'title': 'Walk', 'text': 'Text'})
+        # naive times are in the default time zone
+        response = self.client.post(
+            f'/groups/{self.group.id}/meetings/', {'title': 'Walk', 'location': 'Park', 'time': '2030-12-01T10:00:00'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.post(
+            f'/groups/{self.group.id}/meetings/', {'title': 'Past', 'location': 'Park', 'time': '2020-12-01T10:00:00'}
+        )
+        self.assertEqual(self.counts(), (4, 5, 3))
+
+        meeting = Meeting.objects.get(title='Walk')
+        self.client.patch(f'/meetings/{meeting.id}/', {'time': '2021-01-01T10:00:00Z'})
+        self.assertEqual(self.counts(), (4, 5, 2))
+
+    def test_drifted_counters_dont_go_negative(self):
+        Group.objects.filter(id=self.group.id).update(post_count=0, meeting_count=0, upcoming_meeting_count=0)
+        self.assertEqual(self.client.delete(f'/posts/{self.group.posts.first().id}/').status_code, 204)
+        self.assertEqual(self.client.delete(f'/meetings/{self.group.meetings.first().id}/').status_code, 204)
+        self.assertEqual(self.counts(), (0, 0, 0))
+
+        call_command('repair_counters', stdout=StringIO())
+        self.assertEqual(self.counts(), (2, 2, 2))
+        self.assertEqual(list(Meeting.objects.values_list('attendee_count', flat=True)), [3, 3])
+
+
+class AttendanceTests(TestCase):
+    def setUp(self):
+        self.users, self.group = create_data()
+        self.meeting = self.group.meetings.first()
+        self.user = User.objects.create(email='new@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, action, meeting_id=None, detail=False):
+        meeting_id = self.meeting.id if meeting_id is None else meeting_id
+        return self.client.post(f'/meetings/{meeting_id}/{action}' + ('?detail=true' if detail else ''))
+
+    def test_attend_and_unattend(self):
+        self.assertEqual(self.post('attend').json(), {'success': True, 'attending': True, 'attendee_count': 4})
+        self.assertEqual(self.post('attend').json(), {
+            'success': False, 'attending': True, 'attendee_count': 4, 'message': 'You are already attending this meeting'
+        })
+        self.assertEqual(self.meeting.attendees.filter(id=self.user.id).count(), 1)
+        self.assertEqual(self.post('unattend').json(), {'success': True, 'attending': False, 'attendee_count': 3})
+        self.assertFalse(self.post('unattend').json()['success'])
+        self.meeting.refresh_from_db()
+        self.assertEqual(self.meeting.attendee_count, 3)
+
+    def test_detail_and_missing_meetings(self):
+        detail = self.post('attend', detail=True).json()
+        self.assertIn(self.user.email, [attendee['email'] for attendee in detail['attendees']])
+        self.assertEqual(self.post('attend', meeting_id=0).status_code, 404)
+        self.assertEqual(self.post('unattend', meeting_id=0).status_code, 404)
+
+    def test_drifted_count_stays_at_zero(self):
+        Meeting.objects.filter(id=self.meeting.id).update(attendee_count=0)
+        self.client.force_authenticate(self.users[1])
+        self.assertEqual(self.post('unattend').json()['attendee_count'], 0)
+
+
+class PreviewTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def test_previews_are_bounded(self):
+        for i in range(3, 9):
+            Post.objects.create(title=f'Post {i}', text='Text', user=self.users[1], group=self.group)
+        Group.objects.filter(id=self.group.id).update(post_count=9)
+
+        posts = self.client.get(f'/groups/{self.group.id}/').json()['posts']
+        self.assertEqual(posts['count'], 9)
+        self.assertEqual([post['title'] for post in posts['results']], [f'Post {i}' for i in range(8, 3, -1)])
+        self.assertEqual(posts['url'], f'/groups/{self.group.id}/posts/')
+
+        user = self.client.get(f'/users/{self.users[0].id}/').json()
+        self.assertEqual({name: user[name]['count'] for name in ('animals', 'created_groups', 'attending_meetings')}, {
+            'animals': 3, 'created_groups': 1, 'attending_meetings': 3
+        })
+        self.assertEqual(user['attending_meetings']['url'], f'/users/{self.users[0].id}/meetings/')
+
+    def test_user_collections(self):
+        Group.objects.create(name='Cat people', city='Almaty', creator=self.users[1])
+        groups = self.client.get(f'/users/{self.users[1].id}/groups/').json()
+        self.assertEqual([group['name'] for group in groups['results']], ['Cat people'])
+
+        self.group.meetings.first().attendees.remove(self.users[1])
+        meetings = self.client.get(f'/users/{self.users[1].id}/meetings/', {'page_size': 1}).json()
+        self.assertEqual(meetings['results'][0]['title'], 'Meeting 1')
+        self.assertEqual(self.client.get(meetings['next']).json()['results'][0]['title'], 'Meeting 2')
+        self.assertEqual(self.client.get('/users/0/meetings/').status_code, 404)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.users, self.group = create_data()
+        self.post = self.group.posts.get(user=self.users[1])
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def stats(self):
+        return self.client.get('/cache/stats/').json()
+
+    def change(self, instance, **values):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in values.items():
+                setattr(instance, name, value)
+            instance.save()
+
+    def assertCached(self, url, cached=True):
+        before = self.stats()
+        self.client.get(url)
+        after = self.stats()
+        self.assertEqual(after['hits'] - before['hits'], int(cached), url)
+
+    def test_hits_misses_and_stale_entries(self):
+        url = f'/posts/{self.post.id}/'
+        before = self.stats()
+        self.assertEqual(self.client.get(url).json()['title'], 'Post 1')
+        self.client.get(url)
+        self.change(self.post, title='Renamed')
+        self.assertEqual(self.client.get(url).json()['title'], 'Renamed')
+        after = self.stats()
+        self.assertEqual(
+            {name: after[name] - before[name] for name in ('hits', 'misses', 'stale')},
+            {'hits': 1, 'misses': 1, 'stale': 1}
+        )
+        self.assertGreater(after['invalidations'], before['invalidations'])
+
+        self.client.force_authenticate(self.users[1])
+        self.assertEqual(self.client.get('/cache/stats/').status_code, 403)
+
+    def test_writes_only_invalidate_the_responses_embedding_them(self):
+        other = Group.objects.create(name='Cat people', city='Almaty', creator=self.users[2])
+        urls = [f'/posts/{self.post.id}/', f'/groups/{self.group.id}/', f'/groups/{other.id}/', f'/users/{self.users[2].id}/']
+        for url in urls:
+            self.client.get(url)
+
+        # last_login isn't rendered anywhere but the user's own detail
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[1].last_login = timezone.now()
+            self.users[1].save(update_fields=['last_login'])
+        for url in urls:
+            self.assertCached(url)
+
+        # the author of the post, posting in the first group only
+        self.change(self.users[1], first_name='Renamed')
+        self.assertCached(urls[0], False)
+        self.assertCached(urls[1], False)
+        self.assertCached(urls[2])
+        self.assertEqual(self.client.get(urls[0]).json()['user']['first_name'], 'Renamed')
+
+        self.change(self.group, name='Renamed')
+        self.assertEqual(self.client.get(urls[0]).json()['group']['name'], 'Renamed')
+        self.assertCached(urls[2])
+
+        # the renamed author's meetings are embedded in their attendees' profiles
+        self.client.get(urls[3])
+        self.assertCached(urls[3])
+        meeting = self.group.meetings.first()
+        self.change(meeting, title='Moved')
+        self.assertCached(urls[3], False)
+        self.assertEqual(self.client.get(urls[3]).json()['attending_meetings']['results'][-1]['title'], 'Moved')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.users, self.group = create_data()
+        self.meeting = self.group.meetings.first()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def assertChanged(self, change, *paths):
+        etags = {}
+        for prefix in ('', '/async'):
+            for path in paths:
+                response = self.client.get(prefix + path)
+                etags[prefix + path] = response['ETag']
+                self.assertEqual(self.client.get(prefix + path, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        for path, etag in etags.items():
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_counter_updates(self):
+        group_paths = ('/groups/', f'/groups/{self.group.id}/')
+        self.assertChanged(
+            lambda: self.client.post(f'/groups/{self.group.id}/posts/', {'title': 'New', 'text': 'Text'}),
+            *group_paths
+        )
+        self.assertChanged(
+            lambda: self.client.delete(f'/posts/{self.group.posts.latest("id").id}/'),
+            *group_paths
+        )
+
+    def test_attendance(self):
+        user = User.objects.create(email='new@example.com')
+        self.client.force_authenticate(user)
+        paths = (f'/groups/{self.group.id}/meetings/', f'/meetings/{self.meeting.id}/')
+        self.assertChanged(lambda: self.client.post(f'/meetings/{self.meeting.id}/attend'), *paths)
+        self.assertChanged(lambda: self.client.post(f'/meetings/{self.meeting.id}/unattend'), *paths)
+
+        # one meeting gains an attendee and another loses one
+        other = self.group.meetings.exclude(id=self.meeting.id).first()
+
+        def move_attendee():
+            Meeting.objects.filter(id=self.meeting.id).update(attendee_count=F('attendee_count') + 1)
+            Meeting.objects.filter(id=other.id).update(attendee_count=F('attendee_count') - 1)
+
+        self.assertChanged(move_attendee, paths[0])
+
+    def test_expanded_relations(self):
+        post = self.group.posts.first()
+        animal = Animal.objects.first()
+
+        def save(instance):
+            return lambda: instance.save()
+
+        self.assertChanged(save(self.group), f'/groups/{self.group.id}/posts/?expand=group')
+        self.assertChanged(save(post), f'/posts/{post.id}/comments/?expand=post')
+        self.assertChanged(save(animal.user), f'/users/{animal.user_id}/animals/?expand=user')
+
+    def test_last_modified_only_on_single_rows(self):
+        self.assertNotIn('Last-Modified', self.client.get('/groups/'))
+        self.assertNotIn('Last-Modified', self.client.get(f'/groups/{self.group.id}/'))
+
+        animal = Animal.objects.first()
+        response = self.client.get(f'/animals/{animal.id}/')
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get(f'/animals/{animal.id}/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(f'/async/animals/{animal.id}/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        # deleting the latest post moves the group's latest updated_at back
+        latest = self.group.posts.latest('updated_at')
+        last_modified = http_date(latest.updated_at.timestamp() + 1)
+        latest.delete()
+        self.assertEqual(self.client.get(f'/groups/{self.group.id}/posts/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[1])
+
+    def post_batch(self, path, items):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(path, items, format='json').json()
+
+    def test_size_limits(self):
+        self.assertEqual(self.post_batch('/posts/batch/', {'title': 'Walk'}), {
+            'success': False, 'error': 'Expected a list of items'
+        })
+        with override_settings(BATCH_MAX_SIZE=2):
+            items = [{'group': self.group.id, 'title': f'Walk {i}', 'text': 'Text'} for i in range(3)]
+            self.assertEqual(self.post_batch('/posts/batch/', items), {
+                'success': False, 'error': 'A batch can contain at most 2 items'
+            })
+            self.assertTrue(self.post_batch('/posts/batch/', items[:2])['success'])
+
+        self.assertEqual(Post.objects.filter(title__startswith='Walk').count(), 2)
+        self.assertEqual(self.post_batch('/posts/batch/', []), {'success': True, 'results': []})
+
+    def test_invalid_items_are_reported_and_skipped(self):
+        response = self.post_batch('/posts/batch/', [
+            {'group': self.group.id, 'title': 'Walk', 'text': 'Text'},
+            {'group': self.group.id, 'text': 'Text'},
+            {'group': 0, 'title': 'Walk', 'text': 'Text'},
+            'Walk',
+            {'group': self.group.id, 'title': 'W' * 81, 'text': 'Text'},
+            {'group': str(self.group.id), 'title': 'Run', 'text': 'Text'}
+        ])
+        self.assertFalse(response['success'])
+        results = response['results']
+        self.assertEqual([result['index'] for result in results], list(range(6)))
+        self.assertEqual([result['success'] for result in results], [True, False, False, False, False, True])
+        self.assertEqual(results[1]['error'], {'title': ['This field is required.']})
+        self.assertEqual(results[2]['error'], {'group': ['Group 0 does not exist']})
+        self.assertEqual(results[3]['error'], ['Expected an object'])
+        self.assertIn('title', results[4]['error'])
+        self.assertEqual([results[0]['data']['title'], results[5]['data']['title']], ['Walk', 'Run'])
+        self.assertEqual(list(self.group.posts.filter(user=self.users[1]).values_list('title', flat=True)), ['Post 1', 'Walk', 'Run'])
+
+    def test_side_effects(self):
+        group = self.client.get(f'/groups/{self.group.id}/').json()
+        post = self.group.posts.first()
+        self.assertEqual(len(self.client.get(f'/posts/{post.id}/').json()['comments']), 2)
+
+        self.post_batch('/posts/batch/', [{'group': self.group.id, 'title': f'Walk {i}', 'text': 'Text'} for i in range(2)])
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 5)
+        # the cached group detail is rebuilt with the new count and posts
+        self.assertEqual(self.client.get(f'/groups/{self.group.id}/').json()['post_count'], group['post_count'] + 2)
+        for user in self.users:
+            self.assertEqual(FeedEntry.objects.filter(user=user).count(), 2)
+
+        self.post_batch('/comments/batch/', [{'post': post.id, 'text': 'Nice', 'rating': '5'}])
+        self.assertEqual(len(self.client.get(f'/posts/{post.id}/').json()['comments']), 3)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        instrumentation.reset()
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def test_percentiles(self):
+        self.assertEqual(instrumentation.percentiles(range(100, 0, -1)), {'p50': 50, 'p95': 95, 'p99': 99})
+        self.assertEqual(instrumentation.percentiles([7]), {'p50': 7, 'p95': 7, 'p99': 7})
+        self.assertEqual(instrumentation.percentiles([1, 2, 3, 4]), {'p50': 2, 'p95': 4, 'p99': 4})
+
+    def test_stats_per_route(self):
+        with self.assertLogs('website.requests', 'INFO') as logs:
+            for _ in range(3):
+                self.client.get(f'/groups/{self.group.id}/posts/')
+        self.assertIn(f'path=/groups/{self.group.id}/posts/ route=GET /groups/<int:group_id>/posts/ status=200', logs.output[0])
+
+        stats = self.client.get('/instrumentation/stats/').json()
+        route = stats['GET /groups/<int:group_id>/posts/']
+        self.assertEqual((route['count'], route['samples']), (3, 3))
+        self.assertEqual(set(route), {'count', 'samples', 'queries', 'db_ms', 'serialize_ms', 'view_ms'})
+        self.assertGreater(route['queries']['p50'], 0)
+        self.assertLessEqual(route['view_ms']['p50'], route['view_ms']['p99'])
+
+        self.client.force_authenticate(self.users[1])
+        self.assertEqual(self.client.get('/instrumentation/stats/').status_code, 403)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.users, self.group = create_data()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        overrides = override_settings(PROFILER_ENABLED=True, PROFILER_RATE=0, PROFILER_DIRECTORY=self.directory.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # the middleware is set up with the settings of the client's first request
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def get(self, token=None):
+        headers = {} if token is None else {'HTTP_X_PROFILE': token}
+        return self.client.get(f'/groups/{self.group.id}/posts/', **headers)
+
+    def test_only_signed_tokens_profile_requests(self):
+        with mock.patch('django.core.signing.time.time', return_value=time.time() - settings.PROFILER_TOKEN_MAX_AGE - 60):
+            expired = profiling.make_token()
+        for token in (None, '', 'profile', profiling.make_token() + 'x', expired):
+            self.assertEqual(self.get(token).status_code, 200)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+        output = StringIO()
+        call_command('profile_token', stdout=output)
+        find_or_404 = views.find_or_404
+
+        def slow_find_or_404(*args, **kwargs):
+            # long enough for the sampler to catch the view
+            time.sleep(0.05)
+            return find_or_404(*args, **kwargs)
+
+        with mock.patch('website.views.find_or_404', slow_find_or_404), self.assertLogs('website.middleware', 'INFO') as logs:
+            self.assertEqual(self.get(output.getvalue().strip()).status_code, 200)
+        self.assertIn(f'profiled method=GET path=/groups/{self.group.id}/posts/', logs.output[0])
+
+        path, = Path(self.directory.name).iterdir()
+        self.assertTrue(path.name.endswith('-GET-groups-int-group-id-posts.collapsed'), path.name)
+        stacks = [line.rsplit(' ', 1) for line in path.read_text().splitlines()]
+        self.assertTrue(any('website.views:get' in stack.split(';') for stack, count in stacks), stacks)
+        self.assertTrue(all(int(count) > 0 for stack, count in stacks))
+
+    def test_breakdown(self):
+        sampler = profiling.Sampler(threading.get_ident(), 1)
+        sampler.stacks.update({
+            ('website.views:get', 'django.db.models.query:__iter__'): 3,
+            ('website.views:get', 'website.serializers:to_representation', 'django.db.models.query:__iter__'): 1,
+            ('website.views:get', 'website.serializers:to_representation'): 2,
+            ('website.views:get', 'rest_framework.renderers:render', 'json.encoder:encode'): 1,
+            ('website.views:get',): 4
+        })
+        self.assertEqual(sampler.get_breakdown(), {'orm': 4, 'serializer': 2, 'render': 1, 'view': 4})
+
+
+class ValuesSerializationTests(TestCase):
+    def setUp(self):
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def test_mappers_render_identical_json(self):
+        querysets = {
+            UserIndexSerializer: User.objects.all(),
+            GroupIndexSerializer: Group.objects.all(),
+            PostIndexSerializer: Post.objects.all(),
+            CommentIndexSerializer: Comment.objects.all(),
+            MeetingIndexSerializer: Meeting.objects.all(),
+            AnimalIndexSerializer: Animal.objects.all()
+        }
+        renderer = JSONRenderer()
+        for serializer_class, queryset in querysets.items():
+            mapper = values.get_mapper(serializer_class)
+            self.assertIsNotNone(mapper, serializer_class.__name__)
+            expected = renderer.render(serializer_class(queryset.order_by('id'), many=True).data)
+            actual = renderer.render(mapper.many(mapper.select(queryset.order_by('id'))))
+            self.assertEqual(actual, expected, serializer_class.__name__)
+
+    def test_unsupported_serializers_have_no_mapper(self):
+        self.assertIsNone(values.get_mapper(GroupDetailSerializer))
+        self.assertIsNone(values.get_mapper(MeetingDetailSerializer))
+
+    def test_list_endpoints_render_identical_responses(self):
+        post = self.group.posts.first()
+        urls = [
+            '/users/',
+            '/groups/',
+            f'/groups/{self.group.id}/posts/',
+            f'/groups/{self.group.id}/meetings/',
+            f'/posts/{post.id}/comments/',
+            f'/users/{self.users[0].id}/animals/',
+            f'/users/{self.users[0].id}/groups/',
+            f'/users/{self.users[0].id}/meetings/?page_size=2'
+        ]
+        for url in urls:
+            with override_settings(VALUES_SERIALIZATION=True):
+                fast = self.client.get(url)
+            with override_settings(VALUES_SERIALIZATION=False):
+                slow = self.client.get(url)
+
+            self.assertEqual(fast.status_code, 200, url)
+            self.assertEqual(fast.content, slow.content, url)
+
+
+class BenchmarkTests(TestCase):
+    def test_seeded_routes_respond(self):
+        call_command(
+            'seed', users=20, groups=3, posts=30, comments=30, meetings=10, animals=10, random_seed=1,
+            stdout=StringIO()
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            call_command('benchmark', requests=2, warmup=0, output=output, stdout=StringIO())
+            with open(output) as result:
+                routes = json.load(result)['routes']
+
+        self.assertIn('GET /groups/<int:group_id>/posts/', routes)
+        for name, result in routes.items():
+            if 'stats' not in name:
+                self.assertEqual(result['errors'], 0, name)
+
+    def test_tokens_carry_the_user_claims(self):
+        user = create_data()[0][1]
+        token = AccessToken(get_authorization(user).split()[1])
+        self.assertEqual((token['email'], token['address_city']), (user.email, user.address_city))
+
+
+class ASGIBenchmarkTests(TransactionTestCase):
+    # the ASGI application runs each request's queries in a thread of its own,
+    # which only sees committed rows
+    def test_concurrent_requests(self):
+        call_command('seed', users=5, groups=2, posts=5, comments=5, meetings=2, animals=2, random_seed=1, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            call_command(
+                'benchmark', asgi=True, concurrency=4, requests=8, warmup=0, route=['groups/<int:group_id>/posts/'],
+                output=output, stdout=StringIO()
+            )
+            with open(output) as result:
+                result = json.load(result)
+
+        self.assertEqual((result['driver'], result['concurrency']), ('ASGIDriver', 4))
+        self.assertEqual(set(result['routes']), {'GET /groups/<int:group_id>/posts/', 'GET /async/groups/<int:group_id>/posts/'})
+        for name, route in result['routes'].items():
+            self.assertEqual((route['requests'], route['errors']), (8, 0), name)
+            self.assertGreater(route['queries']['p50'], 0, name)
+
+
+class QueryPlanTests(TestCase):
+    def test_list_queries_use_indexes(self):
+        output = StringIO()
+        try:
+            call_command('explain_queries', stdout=output)
+        except CommandError as error:
+            self.fail(f'{error}\n{output.getvalue()}')
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Requests every route with small and large related collections and page
+    sizes, and checks the number of queries doesn't grow with them and stays
+    within the budget declared in query_budgets.json.
+    """
+    sizes = (2, 8)
+    page_sizes = (None, 3)
+
+    def count_queries(self, size):
+        User.objects.all().delete()
+        users, _ = create_data(size)
+        client = APIClient()
+        client.force_authenticate(users[0])
+        routes, _ = get_routes()
+        counts = {}
+        for method, route, view_class in routes:
+            path, _, query = build_path(route, view_class).partition('?')
+            for page_size in self.page_sizes if method == 'GET' else (None,):
+                data = dict(parse_qsl(query))
+                if page_size:
+                    data['page_size'] = page_size
+                # measure the uncached responses
+                cache.get_cache().clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(client, method.lower())(path, data or None)
+                    if response.streaming:
+                        response.getvalue()
+                self.assertLess(response.status_code, 400, path)
+                counts[f'{method} {route}', page_size] = len(queries)
+
+        return counts
+
+    def test_query_counts(self):
+        with open(Path(__file__).parent / 'query_budgets.json') as budgets_file:
+            budgets = json.load(budgets_file)
+
+        small, large = [self.count_queries(size) for size in self.sizes]
+        for (route, page_size), count in large.items():
+            with self.subTest(route=route, page_size=page_size):
+                self.assertIn(route, budgets, 'Add the route to query_budgets.json')
+                self.assertEqual(count, small[route, page_size], 'Query count grows with the data')
+                self.assertEqual(count, small[route, None], 'Query count grows with the page size')
+                self.assertLessEqual(count, budgets[route], 'Over the query budget')
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def search(self, query, **params):
+        return self.client.get('/search/', {'q': query, **params}).json()
+
+    def test_ranked_results_across_models(self):
+        post = Post.objects.create(title='Lost dog', text='Lost dog near the lost river', user=self.users[0], group=self.group)
+        Post.objects.create(title='Found', text='Found a dog', user=self.users[0], group=self.group)
+        results = self.search('dog')['results']
+        self.assertEqual({result['type'] for result in results}, {'post', 'group'})
+        self.assertEqual(self.search('lost dog')['results'][0]['object']['id'], post.id)
+        self.assertEqual([result['type'] for result in self.search('dog', type='group')['results']], ['group'])
+
+    def test_index_follows_writes(self):
+        comment = Comment.objects.create(text='muddy paws', rating='4', post=self.group.posts.first(), user=self.users[1])
+        self.assertEqual(len(self.search('muddy')['results']), 1)
+        comment.text = 'clean paws'
+        comment.save()
+        self.assertEqual(self.search('muddy')['results'], [])
+        comment.delete()
+        self.assertEqual(self.search('paws')['results'], [])
+
+    def test_cursor_pages(self):
+        for i in range(7):
+            Post.objects.create(title=f'Walk {i}', text='walk ' * (i + 1), user=self.users[0], group=self.group)
+
+        seen = []
+        page = self.search('walk', page_size=3)
+        while True:
+            seen += [result['object']['id'] for result in page['results']]
+            if page['next'] is None:
+                break
+            page = self.client.get(page['next']).json()
+
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+        previous = self.client.get(page['previous']).json()
+        self.assertEqual([result['object']['id'] for result in previous['results']], seen[3:6])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('"dog*(')['results'][0]['type'], 'group')
+        self.assertFalse(self.search('  ')['success'])
+
+
+class FeedTests(TestCase):
+    def setUp(self):
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[1])
+
+    def feed(self, **params):
+        return self.client.get('/feed/', params).json()
+
+    def publish(self, count=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                Post.objects.create(title=f'Walk {i}', text='Text', user=self.users[2], group=self.group)
+                for i in range(count)
+            ]
+
+    def test_new_posts_are_fanned_out(self):
+        post, = self.publish()
+        with self.captureOnCommitCallbacks(execute=True):
+            meeting = Meeting.objects.create(
+                title='Walk', location='Park', time=timezone.now(), group=self.group, creator=self.users[0]
+            )
+        for user in self.users:
+            self.assertEqual(FeedEntry.objects.filter(user=user).count(), 2)
+
+        results = self.feed()['results']
+        self.assertEqual([(item['type'], item['id']) for item in results], [('meeting', meeting.id), ('post', post.id)])
+        self.assertEqual(results[1]['object']['group']['name'], 'Dog walkers')
+
+    @override_settings(FEED_MAX_LENGTH=3, FEED_TRIM_INTERVAL=1)
+    def test_feeds_are_trimmed(self):
+        posts = self.publish(5)
+        self.assertEqual([item['id'] for item in self.feed()['results']], [post.id for post in reversed(posts[2:])])
+        self.assertEqual(FeedEntry.objects.count(), 3 * len(self.users))
+
+    @override_settings(FEED_FANOUT_LIMIT=2)
+    def test_large_groups_are_read_from_the_group(self):
+        post, = self.publish()
+        self.group.refresh_from_db()
+        self.assertTrue(self.group.fanout_on_read)
+        self.assertFalse(FeedEntry.objects.exists())
+
+        seen = []
+        page = self.feed(page_size=3)
+        while True:
+            seen += [(item['type'], item['id']) for item in page['results']]
+            if page['next'] is None:
+                break
+            page = self.client.get(page['next']).json()
+
+        self.assertEqual(seen[0], ('post', post.id))
+        self.assertEqual(len(set(seen)), Post.objects.count() + Meeting.objects.count())
+        previous = self.client.get(page['previous']).json()
+        self.assertEqual([(item['type'], item['id']) for item in previous['results']], seen[3:6])
+
+        self.client.force_authenticate(User.objects.create(email='new@example.com'))
+        self.assertEqual(self.feed()['results'], [])
+
+    def test_fanout_flag_is_internal(self):
+        group = Group.objects.get(id=self.group.id)
+        Group.objects.filter(id=self.group.id).update(fanout_on_read=True)
+        group.name = 'Cat people'
+        group.save()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.name, 'Cat people')
+        self.assertTrue(self.group.fanout_on_read)
+        self.assertNotIn('fanout_on_read', self.client.get(f'/groups/{self.group.id}/').json())
+
+    @override_settings(FEED_FANOUT_MAX_ENTRIES=5)
+    def test_large_fan_outs_are_deferred(self):
+        items = [{'group': self.group.id, 'title': f'Walk {i}', 'text': 'Text'} for i in range(2)]
+        with mock.patch.object(feed, 'defer') as defer, self.captureOnCommitCallbacks(execute=True):
+            results = self.client.post('/posts/batch/', items, format='json').json()['results']
+        self.group.refresh_from_db()
+        self.assertFalse(self.group.fanout_on_read)
+        self.assertFalse(FeedEntry.objects.exists())
+
+        deferred, = defer.call_args.args
+        feed.fan_out(deferred)
+        self.assertEqual(
+            [item['id'] for item in self.feed()['results'][:2]], [result['data']['id'] for result in reversed(results)]
+        )
+
+
+class UpcomingMeetingTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def upcoming(self, **params):
+        return [meeting['id'] for meeting in self.client.get('/meetings/upcoming/', params).json()['results']]
+
+    def test_cached_city_follows_meeting_changes(self):
+        self.assertEqual(self.upcoming(), list(Meeting.objects.filter(time__gt=timezone.now()).values_list('id', flat=True)))
+        with self.captureOnCommitCallbacks(execute=True):
+            meeting = Meeting.objects.create(
+                title='Soon', location='Park', time=timezone.now() + timedelta(hours=1), group=self.group, creator=self.users[1]
+            )
+        self.assertEqual(self.upcoming()[0], meeting.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            meeting.time = timezone.now() + timedelta(days=30)
+            meeting.save()
+        self.assertNotIn(meeting.id, self.upcoming())
+        later = {'from': (timezone.now() + timedelta(days=29)).isoformat(), 'to': (timezone.now() + timedelta(days=31)).isoformat()}
+        self.assertEqual(self.upcoming(**later), [meeting.id])
+        self.assertEqual(self.upcoming(city='Astana'), [])
+
+    def test_deleted_meetings_leave_the_cache(self):
+        upcoming = self.upcoming()
+        with self.captureOnCommitCallbacks(execute=True):
+            for meeting in Meeting.objects.filter(id__in=upcoming[1:]):
+                meeting.delete()
+        self.assertEqual(len(cache.get_cache().get(discovery._key('Almaty'))['rows']), 1)
+        page = self.client.get('/meetings/upcoming/', {'page_size': 1}).json()
+        self.assertEqual([meeting['id'] for meeting in page['results']], upcoming[:1])
+        self.assertIsNone(page['next'])
+
+    def test_past_windows_are_not_cached(self):
+        window = {'from': '2000-01-01T00:00:00Z', 'to': (timezone.now() + timedelta(days=365)).isoformat()}
+        self.assertEqual(len(self.upcoming(**window)), Meeting.objects.count())
+        self.assertIsNone(cache.get_cache().get(discovery._key('Almaty')))
+
+    def test_pages_by_time(self):
+        first = self.client.get('/meetings/upcoming/', {'page_size': 1}).json()
+        second = self.client.get(first['next']).json()
+        self.assertLess(first['results'][0]['time'], second['results'][0]['time'])
+        self.assertEqual(self.client.get(second['previous']).json()['results'], first['results'])
+
+
+class GroupExportTests(TestCase):
+    def setUp(self):
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def test_ndjson(self):
+        response = self.client.get(f'/groups/{self.group.id}/export/')
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in response.getvalue().decode().splitlines()]
+        self.assertEqual(
+            [row['type'] for row in rows],
+            ['post'] * 3 + ['comment'] * 6 + ['meeting'] * 3
+        )
+
+    def test_csv(self):
+        response = self.client.get(f'/groups/{self.group.id}/export/', {'output': 'csv'})
+        lines = response.getvalue().decode().splitlines()
+        self.assertTrue(lines[0].startswith('type,id,'))
+        self.assertEqual(len(lines), 1 + 12)
+
+    def test_only_the_creator_can_export(self):
+        self.client.force_authenticate(self.users[1])
+        self.assertFalse(self.client.get(f'/groups/{self.group.id}/export/').json()['success'])
+
+
+class FieldSelectionTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        return response, queries
+
+    def test_sparse_detail_loads_less(self):
+        post = self.group.posts.first()
+        full, full_queries = self.get(f'/posts/{post.id}/')
+        sparse, sparse_queries = self.get(f'/posts/{post.id}/', fields='id,title')
+        self.assertEqual(sparse.json(), {'id': post.id, 'title': post.title})
+        self.assertIn('comments', full.json())
+        self.assertLess(len(sparse_queries), len(full_queries))
+        loaded = sparse_queries[-1]['sql']
+        self.assertNotIn('JOIN', loaded)
+        self.assertNotIn('"text"', loaded)
+
+    def test_sparse_list_pages(self):
+        for serialization in (True, False):
+            with override_settings(VALUES_SERIALIZATION=serialization):
+                page = self.get(f'/groups/{self.group.id}/posts/', fields='title', page_size=2)[0].json()
+                self.assertEqual(page['results'], [{'title': 'Post 0'}, {'title': 'Post 1'}])
+                self.assertEqual(self.client.get(page['next']).json()['results'], [{'title': 'Post 2'}])
+
+    def test_expand(self):
+        post = self.group.posts.first()
+        default = self.client.get(f'/posts/{post.id}/comments/').json()['results'][0]
+        expanded = self.client.get(f'/posts/{post.id}/comments/', {'expand': 'post'}).json()['results'][0]
+        self.assertNotIn('post', default)
+        self.assertEqual(expanded, {**default, 'post': {'id': post.id, 'title': post.title, 'user': default['user']}})
+        self.assertEqual(
+            self.client.get(f'/groups/{self.group.id}/meetings/', {'fields': 'title,group'}).json()['results'][0]['group']['id'],
+            self.group.id
+        )
+
+    def test_cached_responses_are_kept_apart(self):
+        url = f'/users/{self.users[0].id}/'
+        self.assertEqual(set(self.client.get(url, {'fields': 'email'}).json()), {'email'})
+        self.assertIn('animals', self.client.get(url).json())
+
+    def test_unknown_fields(self):
+        self.assertEqual(self.client.get('/users/', {'fields': 'password'}).status_code, 400)
+        self.assertEqual(self.client.get(f'/groups/{self.group.id}/posts/', {'expand': 'title'}).status_code, 400)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def test_same_responses_as_sync_views(self):
+        routes, _ = get_routes()
+        for method, route, view_class in routes:
+            if not route.startswith('/async/'):
+                continue
+            path = build_path(route, view_class)
+            for params in ({}, {'page_size': 2}, {'fields': 'id'} if 'id' in view_class.serializer_class().fields else {}):
+                with self.subTest(path=path, params=params):
+                    sync = self.client.get(path.replace('/async', '', 1), params)
+                    response = self.client.get(path, params)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.content.replace(b'/async/', b'/'), sync.content)
+
+    def test_errors(self):
+        self.assertEqual(self.client.get('/async/posts/0/').status_code, 404)
+        self.assertEqual(self.client.get('/async/groups/', {'fields': 'password'}).status_code, 400)
+        etag = self.client.get('/async/groups/')['ETag']
+        self.assertEqual(self.client.get('/async/groups/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/async/groups/').status_code, 401)
+
+    def test_permission_classes(self):
+        view = type('SuperUserGroupIndexAPIView', (async_views.GroupIndexAPIView,), {
+            'permission_classes': (IsSuperUser,)
+        }).as_view()
+        factory = APIRequestFactory()
+        for user, status in ((self.users[0], 200), (self.users[1], 403), (None, 401)):
+            headers = {} if user is None else {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+            with self.subTest(user=user):
+                self.assertEqual(async_to_sync(view)(factory.get('/async/groups/', **headers)).status_code, status)
+
+    async def test_async_request_handling(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.users[0]).access_token))()
+        response = await AsyncClient().get(
+            f'/async/groups/{self.group.id}/posts/', headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(len(response.json()['results']), 3)
+        # the queries of the view were measured in the request's thread, the token's user included
+        self.assertIn('desc="4 queries"', response['Server-Timing'])
+
+
+class TokenUserTests(TestCase):
+    def setUp(self):
+        self.users, self.group = create_data()
+        self.user = self.users[1]
+        self.user.set_password('secret')
+        self.user.save()
+        authentication.forget_user(self.user.pk)
+        self.client = APIClient()
+        tokens = self.client.post('/sign_in/', {'email': self.user.email, 'password': 'secret'}).json()
+        self.refresh = tokens['refresh']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+
+    def authenticate(self, access):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        return authentication.TokenUserAuthentication().authenticate(request)[0]
+
+    def test_requests_dont_load_the_user(self):
+        # the first request caches the user's row
+        self.client.get('/meetings/upcoming/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/meetings/upcoming/')
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertFalse([query for query in queries if 'FROM "website_user" WHERE' in query['sql']])
+
+    def test_deleted_users_are_rejected(self):
+        self.assertEqual(self.client.get('/meetings/upcoming/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        response = self.client.get('/meetings/upcoming/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], 'User not found')
+
+    def test_privileges_are_not_taken_from_the_token(self):
+        access = AccessToken(self.client._credentials['HTTP_AUTHORIZATION'].split()[1])
+        self.assertNotIn('is_superuser', access)
+        # a token made before the flag was left out of the claims
+        access['is_superuser'] = True
+        self.assertFalse(self.authenticate(str(access)).is_superuser)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_superuser = True
+            self.user.save()
+        self.assertEqual(self.client.get('/cache/stats/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_superuser = False
+            self.user.save()
+        self.assertEqual(self.client.get('/cache/stats/').status_code, 403)
+
+    def test_other_fields_come_from_the_user_cache(self):
+        access = self.client._credentials['HTTP_AUTHORIZATION'].split()[1]
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(access).last_name, 'Last')
+            self.assertEqual(self.authenticate(access).bio, None)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.bio = 'Dog person'
+            self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(access).bio, 'Dog person')
+
+    def test_refresh_reads_the_claims_again(self):
+        self.assertEqual(AccessToken(self.client.post('/sign_in/refresh/', {'refresh': self.refresh}).json()['access'])['address_city'], 'Almaty')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.address_city = 'Astana'
+            self.user.save()
+        access = self.client.post('/sign_in/refresh/', {'refresh': self.refresh}).json()['access']
+        self.assertEqual(AccessToken(access)['address_city'], 'Astana')
+        self.assertEqual(self.authenticate(access), self.user)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.users, self.group = create_data()
+        replicas._ejected.clear()
+        self.router = replicas.ReplicaRouter()
+
+    def read_alias(self):
+        return self.router.db_for_read(Post)
+
+    def test_sticky_markers_need_a_shared_cache(self):
+        with override_settings(DATABASE_REPLICAS=['replica1']):
+            self.assertEqual([warning.id for warning in replicas.check_sticky_cache(None)], ['website.W001'])
+            shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'}}
+            with override_settings(CACHES=shared):
+                self.assertEqual(replicas.check_sticky_cache(None), [])
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(replicas.check_sticky_cache(None), [])
+
+    def test_reads_of_a_request_use_one_healthy_replica(self):
+        self.assertEqual(self.read_alias(), 'default')
+        with mock.patch.object(replicas, 'is_healthy', return_value=True):
+            aliases = []
+            for _ in range(2):
+                with replicas.routing(True):
+                    aliases.append(self.read_alias())
+                    self.assertEqual(self.read_alias(), aliases[-1])
+                    self.assertEqual(self.router.db_for_write(Post), 'default')
+                    with replicas.primary():
+                        self.assertEqual(self.read_alias(), 'default')
+            self.assertEqual(set(aliases), {'replica1', 'replica2'})
+
+        with mock.patch.object(replicas, 'is_healthy', side_effect=lambda alias: alias == 'replica2'):
+            with replicas.routing(True):
+                self.assertEqual(self.read_alias(), 'replica2')
+        with mock.patch.object(replicas, 'is_healthy', return_value=False):
+            with replicas.routing(True):
+                self.assertEqual(self.read_alias(), 'default')
+
+    def test_unreachable_replicas_are_ejected(self):
+        broken = mock.Mock(vendor='postgresql')
+        broken.ensure_connection.side_effect = OperationalError('could not connect')
+        with mock.patch.object(replicas, 'connections', {'replica1': broken}):
+            self.assertFalse(replicas.is_healthy('replica1'))
+            self.assertFalse(replicas.is_healthy('replica1'))
+        self.assertEqual(broken.ensure_connection.call_count, 1)
+
+    def test_writers_read_from_the_primary(self):
+        access = str(AccessToken.for_user(self.users[1]))
+        factory = APIRequestFactory()
+        read = factory.get('/groups/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertTrue(replicas.uses_replicas(read))
+
+        write = factory.post('/meetings/1/attend')
+        write.user = self.users[1]
+        replicas.wrote(write, Response(status=200))
+        self.assertFalse(replicas.uses_replicas(read))
+        self.assertTrue(replicas.uses_replicas(factory.get('/groups/')))
+        self.assertFalse(replicas.uses_replicas(write))
+
+
+class DatabaseStatsTests(TestCase):
+    def test_connections_of_the_process(self):
+        users, _ = create_data()
+        client = APIClient()
+        client.force_authenticate(users[1])
+        self.assertEqual(client.get('/database/stats/').status_code, 403)
+
+        client.force_authenticate(users[0])
+        stats = client.get('/database/stats/').json()['default']
+        self.assertEqual((stats['open'], stats['in_use'], stats['idle']), (1, 1, 0))
+        self.assertEqual(stats['closed'], stats['opened'] - 1)
+        self.assertEqual(database.get_stats()['default']['in_use'], 0)
+
+
+@override_settings(
+    THROTTLE_ENABLED=True,
+    THROTTLE_FILE=Path(tempfile.gettempdir()) / f'pet_meet-throttle-test-{os.getpid()}',
+    REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'user': '10/min', 'ip': '100/min'}}
+)
+class ThrottleTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        Path(settings.THROTTLE_FILE).unlink(missing_ok=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        throttling.get_store().clear()
+        self.users, self.group = create_data()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[1])
+
+    def test_requests_pay_their_cost(self):
+        self.assertEqual(self.client.get(f'/groups/{self.group.id}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/groups/{self.group.id}/').status_code, 200)
+        response = self.client.get(f'/groups/{self.group.id}/')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(response['Retry-After'], ('29', '30'))
+        async_response = self.client.get(f'/async/groups/{self.group.id}/')
+        self.assertEqual((async_response.status_code, async_response['Retry-After']), (429, response['Retry-After']))
+
+        other = APIClient()
+        other.force_authenticate(self.users[2])
+        self.assertEqual(other.get(f'/groups/{self.group.id}/').status_code, 200)
+
+    @skipUnless('fork' in multiprocessing.get_all_start_methods(), 'needs fork')
+    def test_buckets_are_shared_between_processes(self):
+        store = throttling.get_store()
+        self.assertEqual(store.take('user:1', 6, 10, 1 / 6), 0)
+        child = multiprocessing.get_context('fork').Process(target=store.take, args=('user:1', 4, 10, 1 / 6))
+        child.start()
+        child.join()
+        self.assertGreater(store.take('user:1', 1, 10, 1 / 6), 0)
+
+
+class SchemaTests(TestCase):
+    def test_docs_serve_the_generated_schema(self):
+        client = APIClient()
+        with tempfile.TemporaryDirectory() as directory:
+            schema_file = Path(directory) / 'openapi.json'
+            with override_settings(SCHEMA_FILE=schema_file):
+                built = client.get('/schema.json')
+                self.assertIn('/groups/{group_id}/', built.json()['paths'])
+                self.assertNotIn('Cache-Control', built)
+
+                call_command('generate_schema', stdout=StringIO())
+                served = client.get('/schema.json')
+                self.assertEqual(served.content, schema_file.read_bytes())
+                self.assertIn('max-age', served['Cache-Control'])
+                self.assertEqual(served.json()['paths'].keys(), built.json()['paths'].keys())
+
+        ui = client.get('/swagger/')
+        self.assertEqual(ui.status_code, 200)
+        self.assertContains(ui, '/schema.json')
@@ -0,0 +1,182 @@
+"""
+Token bucket throttling, with the buckets in a memory mapped file
+(THROTTLE_FILE) shared by the worker processes of a host.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+try:
+    import fcntl
+except ImportError:  # Windows: buckets are per process
+    fcntl = None
+
+
+# key hash (0 for a free slot), tokens, time of the last update
+SLOT = struct.Struct('<Qdd')
+# slots a key can be stored in, the least recently updated one is reused for new keys
+PROBES = 4
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """
+    The capacity and refill rate (tokens per second) of a rate like '600/min'.
+    """
+    count, period = rate.split('/')
+    count = int(count)
+    return count, count / PERIODS[period[0]]
+
+
+def get_cost(request, view):
+    """
+    The tokens a request takes: the view's `throttle_cost`, either a number
+    or a dict of numbers by HTTP method.
+    """
+    cost = getattr(view, 'throttle_cost', 1)
+    if isinstance(cost, dict):
+        return cost.get(request.method, 1)
+
+    return cost
+
+
+class BucketStore:
+    def __init__(self, path, slots):
+        self.path = path
+        self.slots = slots
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def open(self):
+        # reopened in forked workers, as a lock taken through an inherited file wouldn't exclude the parent
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self.slots * SLOT.size
+        with self.file_lock():
+            if os.fstat(self.fd).st_size < size:
+                os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size)
+        self.pid = os.getpid()
+
+    @contextmanager
+    def file_lock(self):
+        if fcntl is None:
+            yield
+            return
+
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def locked(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.open()
+            with self.file_lock():
+                yield
+
+    def take(self, key, cost, capacity, rate):
+        """
+        Takes `cost` tokens from the bucket of `key`. Returns 0 when they were
+        taken, otherwise the seconds until the bucket holds them.
+        """
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        start = key_hash % self.slots
+        with self.locked():
+            now = time.time()
+            offset = oldest = None
+            for i in range(PROBES):
+                slot_offset = (start + i) % self.slots * SLOT.size
+                slot_hash, slot_tokens, slot_updated = SLOT.unpack_from(self.map, slot_offset)
+                if slot_hash == key_hash:
+                    offset = slot_offset
+                    tokens = min(capacity, slot_tokens + max(now - slot_updated, 0) * rate)
+                    break
+                if offset is None or slot_updated < oldest:
+                    offset, oldest = slot_offset, slot_updated
+            else:
+                # a new key, or one whose slot was reused since
+                tokens = capacity
+
+            if tokens >= cost:
+                SLOT.pack_into(self.map, offset, key_hash, tokens - cost, now)
+                return 0
+
+            SLOT.pack_into(self.map, offset, key_hash, tokens, now)
+            return (cost - tokens) / rate
+
+    def clear(self):
+        with self.locked():
+            self.map[:] = bytes(len(self.map))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None or (_store.path, _store.slots) != (settings.THROTTLE_FILE, settings.THROTTLE_SLOTS):
+            _store = BucketStore(settings.THROTTLE_FILE, settings.THROTTLE_SLOTS)
+
+        return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles the clients identified by `get_key` with the rate of `scope`
+    in DEFAULT_THROTTLE_RATES.
+    """
+    scope = None
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if not settings.THROTTLE_ENABLED or rate is None:
+            return True
+
+        capacity, refill_rate = parse_rate(rate)
+        # a cost above the capacity would never be paid
+        cost = min(get_cost(request, view), capacity)
+        self.wait_time = get_store().take(f'{self.scope}:{self.get_key(request)}', cost, capacity, refill_rate)
+        return self.wait_time == 0
+
+    def wait(self):
+        return self.wait_time
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """
+    A bucket per user, per IP address for anonymous requests.
+    """
+    scope = 'user'
+
+    def get_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+
+        return f'ip:{self.get_ident(request)}'
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """
+    A bucket per IP address, shared by the users behind it.
+    """
+    scope = 'ip'
+
+    def get_key(self, request):
+        return self.get_ident(request)
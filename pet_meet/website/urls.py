@@ -1,52 +1,56 @@
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
-from rest_framework import permissions
-
+from rest_framework_simplejwt.views import TokenRefreshView
 from django.urls import path, include
 from django.views.generic import TemplateView
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-from . import views
 
+from . import async_views, schema, views
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Snippets API",
-      default_version='v1',
-      description="Test description",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@snippets.local"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
 
 urlpatterns = [
-    path('', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('', schema.lazy_view('swagger'), name='schema-swagger-ui'),
+    path('schema.json', schema.schema_file, name='schema-file'),
+    path('swagger<format>/', schema.lazy_view(), name='schema-json'),
+    path('swagger/', schema.lazy_view('swagger'), name='schema-swagger-ui'),
+    path('redoc/', schema.lazy_view('redoc'), name='schema-redoc'),
 
     path('sign_up/', views.SignUpAPIView.as_view()),
-    path('sign_in/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('sign_in/', views.SignInAPIView.as_view(), name='token_obtain_pair'),
     path('sign_in/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('users/', views.UserIndexAPIView.as_view()),
     path('users/<int:user_id>/', views.UserDetailAPIView.as_view()),
     path('groups/', views.GroupIndexAPIView.as_view()),
     path('groups/<int:group_id>/', views.GroupDetailAPIView.as_view()),  # if we want to see all posts of a group
-    path('groups/<int:group_id>/posts/', views.PostIndexAPIView.as_view()),
+    path('groups/<int:group_id>/export/', views.GroupExportAPIView.as_view()),
+    path('groups/<int:group_id>/posts/', views.PostIndexAPIView.as_view(), name='group-posts'),
+    path('posts/batch/', views.PostBatchAPIView.as_view()),
     path('posts/<int:pk>/', views.PostDetailAPIView.as_view()),
-    path('groups/<int:group_id>/meetings/', views.MeetingIndexAPIView.as_view()),
+    path('groups/<int:group_id>/meetings/', views.MeetingIndexAPIView.as_view(), name='group-meetings'),
+    path('meetings/upcoming/', views.UpcomingMeetingIndexAPIView.as_view()),
     path('meetings/<int:pk>/', views.MeetingDetailAPIView.as_view()),
     path('meetings/<int:meeting_id>/attend', views.MeetingAttendAPIView.as_view()),
     path('meetings/<int:meeting_id>/unattend', views.MeetingUnattendAPIView.as_view()),
     path('posts/<int:post_id>/comments/', views.CommentIndexAPIView.as_view()),
+    path('comments/batch/', views.CommentBatchAPIView.as_view()),
     path('comments/<int:pk>/', views.CommentDetailAPIView.as_view()),
     path('animals/', views.AnimalCreateAPIView.as_view()),
+    path('animals/batch/', views.AnimalBatchAPIView.as_view()),
     path('animals/<int:pk>/', views.AnimalDetailAPIView.as_view()),
-    path('users/<int:user_id>/animals/', views.AnimalIndexAPIView.as_view())
+    path('users/<int:user_id>/animals/', views.AnimalIndexAPIView.as_view(), name='user-animals'),
+    path('users/<int:user_id>/groups/', views.UserGroupIndexAPIView.as_view(), name='user-groups'),
+    path('users/<int:user_id>/meetings/', views.UserMeetingIndexAPIView.as_view(), name='user-meetings'),
+    path('feed/', views.FeedAPIView.as_view()),
+    path('search/', views.SearchAPIView.as_view()),
+    path('cache/stats/', views.ResponseCacheStatsAPIView.as_view()),
+    path('instrumentation/stats/', views.InstrumentationStatsAPIView.as_view()),
+    path('database/stats/', views.DatabaseStatsAPIView.as_view()),
+
+    path('async/groups/', async_views.GroupIndexAPIView.as_view()),
+    path('async/groups/<int:group_id>/', async_views.GroupDetailAPIView.as_view()),
+    path('async/groups/<int:group_id>/posts/', async_views.PostIndexAPIView.as_view()),
+    path('async/posts/<int:pk>/', async_views.PostDetailAPIView.as_view()),
+    path('async/groups/<int:group_id>/meetings/', async_views.MeetingIndexAPIView.as_view()),
+    path('async/meetings/<int:pk>/', async_views.MeetingDetailAPIView.as_view()),
+    path('async/posts/<int:post_id>/comments/', async_views.CommentIndexAPIView.as_view()),
+    path('async/comments/<int:pk>/', async_views.CommentDetailAPIView.as_view()),
+    path('async/users/<int:user_id>/animals/', async_views.AnimalIndexAPIView.as_view()),
+    path('async/animals/<int:pk>/', async_views.AnimalDetailAPIView.as_view())
 ]
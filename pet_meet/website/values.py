@@ -0,0 +1,116 @@
+"""
+Read-only serialization straight from `.values()` rows.
+
+For a serializer made of plain model fields, forward foreign keys and nested
+serializers of those, `get_mapper()` compiles (once per serializer class and
+field selection) the list of columns to select, joins included, and a
+function shaping a row into the same data the serializer would return. A
+sparse field selection therefore also selects fewer columns and joins. List
+endpoints then skip building model instances and walking the serializer
+fields for every row.
+
+Values are still converted with the serializer fields' own
+`to_representation`, so the rendered JSON is identical. Serializers with
+fields the mapper can't read from a row (to-many relations, previews,
+method fields ...) get no mapper and are serialized as usual.
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+from . import instrumentation
+
+
+class Unsupported(Exception):
+    pass
+
+
+class ValuesMapper:
+    def __init__(self, columns, steps):
+        self.columns = columns
+        self.steps = steps
+
+    def __call__(self, row):
+        data = {}
+        for name, column, convert, nested in self.steps:
+            value = row[column]
+            if value is None:
+                data[name] = None
+            elif nested:
+                data[name] = convert(row)
+            else:
+                data[name] = convert(value)
+
+        return data
+
+    def select(self, queryset, *extra_columns):
+        """
+        The `.values()` query for `queryset`, with `extra_columns` (such as
+        the ones a paginator orders by) selected as well.
+        """
+        columns = list(self.columns)
+        columns += [column for column in extra_columns if column not in columns]
+        return queryset.values(*columns)
+
+    def many(self, rows):
+        with instrumentation.timed('serialize'):
+            return [self(row) for row in rows]
+
+
+def _get_model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        raise Unsupported(name)
+
+
+def _same(value):
+    return value
+
+
+def _compile(serializer, prefix=''):
+    model = serializer.Meta.model
+    columns = []
+    steps = []
+    for field in serializer._readable_fields:
+        if '.' in field.source or field.source == '*':
+            raise Unsupported(field.field_name)
+
+        model_field = _get_model_field(model, field.source)
+        if not model_field.concrete or model_field.many_to_many:
+            raise Unsupported(field.field_name)
+
+        column = prefix + model_field.name
+        if isinstance(field, serializers.ModelSerializer):
+            if not model_field.many_to_one:
+                raise Unsupported(field.field_name)
+
+            nested = _compile(field, f'{column}__')
+            columns += [column] + nested.columns
+            steps.append((field.field_name, column, nested, True))
+        elif isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            # the column of a foreign key already holds the primary key
+            columns.append(column)
+            steps.append((field.field_name, column, _same, False))
+        elif isinstance(field, serializers.BaseSerializer) or isinstance(field, serializers.RelatedField) \
+                or model_field.is_relation:
+            raise Unsupported(field.field_name)
+        else:
+            columns.append(column)
+            steps.append((field.field_name, column, field.to_representation, False))
+
+    return ValuesMapper(columns, steps)
+
+
+@lru_cache(maxsize=512)
+def get_mapper(serializer_class, fields=None, expand=()):
+    """
+    The compiled `ValuesMapper` of `serializer_class` with the given field
+    selection (see `EagerLoadingMixin`), or None when it renders fields a
+    row can't be mapped from.
+    """
+    try:
+        return _compile(serializer_class(fields=fields, expand=expand))
+    except Unsupported:
+        return None
@@ -1,44 +1,216 @@
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.utils import IntegrityError
 from django.http import Http404
 
 from rest_framework.generics import (
     GenericAPIView, ListAPIView, RetrieveUpdateDestroyAPIView
 )
+from rest_framework.exceptions import ParseError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.views import TokenObtainPairView
 
+from . import attendance, cache, counters, database, discovery, export, feed, instrumentation, search, values
+from .conditional import conditional, state
 from .models import User, Meeting, Group, Post, Comment, Animal
+from .pagination import KeysetPagination
+from .permissions import IsSuperUser
 from .serializers import (
     AnimalDetailSerializer, AnimalIndexSerializer, 
     CommentDetailSerializer, CommentIndexSerializer,
     GroupDetailSerializer, GroupIndexSerializer, 
-    MeetingDetailSerializer, MeetingIndexSerializer, 
+    MeetingDetailSerializer, MeetingIndexSerializer, MeetingUpcomingSerializer,
     PostDetailSerializer, PostIndexSerializer, 
     UserDetailSerializer, UserIndexSerializer 
 )
 
 
-def find_or_404(model, pk):
-    record = model.objects.filter(id=pk).first()
+def find_or_404(model, pk, serializer_class=None, **selection):
+    queryset = model.objects.filter(id=pk)
+    if serializer_class is not None:
+        queryset = serializer_class.setup_eager_loading(queryset, **selection)
+
+    record = queryset.first()
     if record == None:
         raise Http404
     
     return record
 
 
-def paginate(request, queryset, serializer_class):
-    paginator = PageNumberPagination()
+def get_selection(request, serializer_class):
+    """
+    The field selection of the `fields` and `expand` query parameters (comma
+    separated field names) of a GET request, as keyword arguments for the
+    serializer, its `setup_eager_loading` and the response cache. Naming an
+    expandable field in `fields` expands it.
+    """
+    if request.method != 'GET':
+        return {}
+
+    fields, expand = [
+        {name.strip() for name in request.query_params.get(param, '').split(',') if name.strip()}
+        for param in ('fields', 'expand')
+    ]
+    if not fields and not expand:
+        return {}
+
+    available = serializer_class(expand=serializer_class.expandable_fields).fields
+    unknown = sorted(name for name in fields | expand if name not in available)
+    if unknown:
+        raise ParseError(f'Unknown fields: {", ".join(unknown)}')
+
+    not_expandable = sorted(expand - set(serializer_class.expandable_fields))
+    if not_expandable:
+        raise ParseError(f'Fields that can\'t be expanded: {", ".join(not_expandable)}')
+
+    expand |= fields & set(serializer_class.expandable_fields)
+    fields -= expand
+    return {'fields': tuple(sorted(fields)) if fields else None, 'expand': tuple(sorted(expand))}
+
+
+def paginate(request, queryset, serializer_class, paginator_class=PageNumberPagination):
+    paginator = paginator_class()
+    selection = get_selection(request, serializer_class)
+    # the paginator reads its position from the ordering columns of the last row
+    ordering = [name.lstrip('-') for name in getattr(paginator, 'ordering', ())]
+    mapper = values.get_mapper(serializer_class, **selection) if settings.VALUES_SERIALIZATION else None
+    if mapper is not None:
+        page = paginator.paginate_queryset(mapper.select(queryset, *ordering), request=request)
+        return paginator.get_paginated_response(mapper.many(page))
+
+    queryset = serializer_class.setup_eager_loading(queryset, **selection, extra_columns=ordering)
     page = paginator.paginate_queryset(queryset, request=request)
-    serializer = serializer_class(page, many=True)
+    serializer = serializer_class(page, many=True, **selection)
     return paginator.get_paginated_response(serializer.data)
 
 
+def parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def resolve_ids(items, field, model):
+    """
+    Loads the `model` rows referenced by `field` of the batch items in one query.
+    """
+    ids = {parse_id(item.get(field)) for item in items if isinstance(item, dict)}
+    ids.discard(None)
+    return model.objects.in_bulk(ids)
+
+
+def create_batch(request, model, serializer_class, required_fields, build, created=None):
+    """
+    Validates every item of a JSON array, inserts the valid ones with one
+    bulk INSERT and returns a result per item.
+
+    `build(item)` returns an unsaved instance or raises ValidationError,
+    `created(instances)` runs in the same transaction as the insert.
+    """
+    items = request.data
+    if not isinstance(items, list):
+        return Response({
+            'success': False,
+            'error': 'Expected a list of items'
+        })
+
+    if len(items) > settings.BATCH_MAX_SIZE:
+        return Response({
+            'success': False,
+            'error': f'A batch can contain at most {settings.BATCH_MAX_SIZE} items'
+        })
+
+    results = []
+    instances = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValidationError('Expected an object')
+
+            missing = [field for field in required_fields if field not in item]
+            if missing:
+                raise ValidationError({field: 'This field is required.' for field in missing})
+
+            instance = build(item)
+            # foreign keys are resolved by `build`, checking them again would query per item
+            instance.clean_fields(exclude=[
+                field.name for field in model._meta.concrete_fields
+                if field.is_relation or (field.null and getattr(instance, field.attname) is None)
+            ])
+        except ValidationError as error:
+            results.append({
+                'index': index,
+                'success': False,
+                'error': error.message_dict if hasattr(error, 'error_dict') else error.messages
+            })
+            continue
+
+        results.append({'index': index, 'success': True})
+        instances.append(instance)
+
+    with transaction.atomic():
+        model.objects.bulk_create(instances)
+        if created is not None and instances:
+            created(instances)
+
+    created_results = iter(serializer_class(instances, many=True).data)
+    for result in results:
+        if result['success']:
+            result['data'] = next(created_results)
+
+    return Response({
+        'success': len(instances) == len(items),
+        'results': results
+    })
+
+
+class EagerLoadingViewMixin:
+    """
+    Loads the relations declared by the view's serializer together with
+    the queryset of generic views, limited to the requested field selection.
+    """
+    def get_selection(self):
+        # drf_yasg inspects views without a request to build the schema
+        if getattr(self, 'swagger_fake_view', False):
+            return {}
+
+        return get_selection(self.request, self.get_serializer_class())
+
+    def get_queryset(self):
+        return self.get_serializer_class().setup_eager_loading(super().get_queryset(), **self.get_selection())
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(*args, **self.get_selection(), **kwargs)
+
+
+class NestedIndexViewMixin:
+    """
+    The queryset of an index nested under another object, e.g. the posts of
+    a group: the rows whose `parent_field` foreign key is the URL parameter
+    of the same name.
+    """
+    parent_field = None
+
+    def get_queryset(self):
+        model = self.serializer_class.Meta.model
+        # drf_yasg inspects views without URL parameters to build the schema
+        if getattr(self, 'swagger_fake_view', False):
+            return model.objects.none()
+
+        return model.objects.filter(**{self.parent_field: self.kwargs[self.parent_field]})
+
+
 class SignUpAPIView(GenericAPIView):
     permission_classes = (AllowAny,)
     serializer_class = UserIndexSerializer
+    throttle_cost = {'POST': 20}  # password hashing
 
     def post(self, request):
         user = User(
@@ -64,24 +236,50 @@ class SignUpAPIView(GenericAPIView):
             })
 
 
-class UserIndexAPIView(ListAPIView):
+class SignInAPIView(TokenObtainPairView):
+    throttle_cost = {'POST': 20}  # password hashing
+
+
+class UserIndexAPIView(EagerLoadingViewMixin, ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserIndexSerializer
     pagination_class = PageNumberPagination
 
+    def get_state(self, request):
+        return [state(User.objects.all())]
+
+    @conditional
+    def get(self, request):
+        return paginate(request, self.get_queryset(), UserIndexSerializer)
+
 
 class UserDetailAPIView(GenericAPIView):
     serializer_class = UserDetailSerializer
-
+    throttle_cost = {'GET': 5}  # previews of the animals, groups and meetings
+
+    def get_state(self, request, user_id):
+        return [
+            state(User.objects.filter(id=user_id)),
+            state(Animal.objects.filter(user_id=user_id)),
+            state(Group.objects.filter(creator_id=user_id), 'creator'),
+            state(Meeting.attendees.through.objects.filter(user_id=user_id)),
+            state(Meeting.objects.filter(attendees=user_id), 'creator')
+        ]
+
+    @conditional
     def get(self, request, user_id):
-        user = find_or_404(User, user_id)
-        serializer = UserDetailSerializer(user)
-        return Response(serializer.data)
+        selection = get_selection(request, UserDetailSerializer)
+        data = cache.get_or_build(
+            User, user_id, UserDetailSerializer,
+            lambda: UserDetailSerializer(find_or_404(User, user_id, UserDetailSerializer, **selection), **selection).data,
+            **selection
+        )
+        return Response(data)
     
     # we don't need to create user using post method cause we have already created him using sign up methon above 
 
     def put(self, request, user_id):
-        user = find_or_404(User, user_id)
+        user = find_or_404(User, user_id, UserDetailSerializer)
         if user != request.user:
             return Response({
                 'success': False,
@@ -102,22 +300,65 @@ class UserDetailAPIView(GenericAPIView):
         return Response(serializer.data)
 
 
-class GroupIndexAPIView(ListAPIView):  # cause of ListCreateAPIView we have get
+class UserGroupIndexAPIView(GenericAPIView):
+    serializer_class = GroupIndexSerializer
+
+    def get_state(self, request, user_id):
+        return [state(Group.objects.filter(creator_id=user_id), 'creator')]
+
+    @conditional
+    def get(self, request, user_id):
+        user = find_or_404(User, user_id)
+        groups = user.created_groups.all()
+        return paginate(request, groups, GroupIndexSerializer, KeysetPagination)
+
+
+class UserMeetingIndexAPIView(GenericAPIView):
+    serializer_class = MeetingIndexSerializer
+
+    def get_state(self, request, user_id):
+        return [
+            state(Meeting.attendees.through.objects.filter(user_id=user_id)),
+            state(Meeting.objects.filter(attendees=user_id), 'creator')
+        ]
+
+    @conditional
+    def get(self, request, user_id):
+        user = find_or_404(User, user_id)
+        meetings = user.attending_meetings.all()
+        return paginate(request, meetings, MeetingIndexSerializer, KeysetPagination)
+
+
+# The serializers, querysets and conditional GET state of the views with an
+# async variant (website/async_views.py) are in mixins the two share.
+
+class GroupIndexViewMixin:
+    queryset = Group.objects.all()
     serializer_class = GroupIndexSerializer
-    pagination_class = PageNumberPagination
 
     def get_queryset(self):
         """
         Optionally restricts the returned purchases to a given user,
         by filtering against a `username` query parameter in the URL.
         """
-        queryset = Group.objects.all()
+        queryset = super().get_queryset()
         city = self.request.query_params.get('city')
         if city is not None:
             queryset = queryset.filter(city=city)
 
         return queryset
 
+    def get_state(self, request):
+        return [state(self.get_queryset(), 'creator')]
+
+
+class GroupIndexAPIView(GroupIndexViewMixin, EagerLoadingViewMixin, ListAPIView):  # cause of ListCreateAPIView we have get
+    pagination_class = PageNumberPagination
+
+    @conditional
+    def get(self, request):
+        return paginate(request, self.get_queryset(), GroupIndexSerializer)
+
     def post(self, request):
         group = Group(
             name=request.data['name'],
@@ -129,16 +370,31 @@ class GroupIndexAPIView(ListAPIView):  # cause of ListCreateAPIView we have get
         return Response(serializer.data)
 
 
-class GroupDetailAPIView(GenericAPIView):
+class GroupDetailViewMixin:
     serializer_class = GroupDetailSerializer
+    throttle_cost = {'GET': 5}  # previews of the posts and meetings
+
+    def get_state(self, request, group_id):
+        return [
+            state(Group.objects.filter(id=group_id), 'creator'),
+            state(Post.objects.filter(group_id=group_id), 'user'),
+            state(Meeting.objects.filter(group_id=group_id), 'creator')
+        ]
 
+
+class GroupDetailAPIView(GroupDetailViewMixin, GenericAPIView):
+    @conditional
     def get(self, request, group_id): 
-        group = find_or_404(Group, group_id)
-        serializer = GroupDetailSerializer(group)
-        return Response(serializer.data)
+        selection = get_selection(request, GroupDetailSerializer)
+        data = cache.get_or_build(
+            Group, group_id, GroupDetailSerializer,
+            lambda: GroupDetailSerializer(find_or_404(Group, group_id, GroupDetailSerializer, **selection), **selection).data,
+            **selection
+        )
+        return Response(data)
     
     def put(self, request, group_id):
-        group = find_or_404(Group, group_id)
+        group = find_or_404(Group, group_id, GroupDetailSerializer)
         if group.creator != request.user: #if the current user is not the creator of the group, they can not update it
             return Response({
                 'success' : False,
@@ -165,13 +421,40 @@ class GroupDetailAPIView(GenericAPIView):
         return Response({'success' : True})
 
 
-class PostIndexAPIView(GenericAPIView):
-    serializer_class = PostIndexSerializer
+class GroupExportAPIView(APIView):
+    throttle_cost = 50  # reads the whole group
 
     def get(self, request, group_id):
         group = find_or_404(Group, group_id)
-        posts = group.posts.all() #one to many
-        return paginate(request, posts, PostIndexSerializer)
+        if group.creator_id != request.user.id:
+            return Response({
+                'success': False,
+                'message': 'You are not the owner of the group'
+            })
+
+        output = request.query_params.get('output', 'ndjson')
+        if output not in export.FORMATS:
+            return Response({
+                'success': False,
+                'error': f'output must be one of {", ".join(export.FORMATS)}'
+            })
+
+        return export.export_response(group.id, output)
+
+
+class PostIndexViewMixin(NestedIndexViewMixin):
+    serializer_class = PostIndexSerializer
+    parent_field = 'group_id'
+
+    def get_state(self, request, group_id):
+        return [state(self.get_queryset(), 'user', 'group', 'group__creator')]
+
+
+class PostIndexAPIView(PostIndexViewMixin, GenericAPIView):
+    @conditional
+    def get(self, request, group_id):
+        find_or_404(Group, group_id)
+        return paginate(request, self.get_queryset(), PostIndexSerializer, KeysetPagination)
 
     def post(self, request, group_id):
         group = find_or_404(Group, group_id)
@@ -181,23 +464,85 @@ class PostIndexAPIView(GenericAPIView):
             user=request.user,
             group=group
         )
-        post.save()
+        with transaction.atomic():
+            post.save()
+            counters.post_created(post)
+
         serializer = PostIndexSerializer(post)
         return Response(serializer.data)
 
 
-class PostDetailAPIView(RetrieveUpdateDestroyAPIView):
-    queryset = Post.objects.all()
+class PostBatchAPIView(GenericAPIView):
+    serializer_class = PostIndexSerializer
+
+    def post(self, request):
+        groups = resolve_ids(request.data if isinstance(request.data, list) else [], 'group', Group)
+
+        def build(item):
+            group = groups.get(parse_id(item['group']))
+            if group is None:
+                raise ValidationError({'group': f'Group {item["group"]} does not exist'})
+
+            return Post(
+                title=item['title'],
+                text=item['text'],
+                user=request.user,
+                group=group
+            )
+
+        def created(posts):
+            counters.posts_created(posts)
+            cache.invalidate(*{(Group, post.group_id) for post in posts})
+            feed.published(posts)
+
+        return create_batch(request, Post, PostIndexSerializer, ('group', 'title', 'text'), build, created)
+
+
+class PostDetailViewMixin:
     serializer_class = PostDetailSerializer
+    throttle_cost = {'GET': 5}  # all of the post's comments
+
+    def get_state(self, request, pk):
+        return [
+            state(Post.objects.filter(id=pk), 'user', 'group', 'group__creator'),
+            state(Comment.objects.filter(post_id=pk), 'user')
+        ]
+
+
+class PostDetailAPIView(PostDetailViewMixin, EagerLoadingViewMixin, RetrieveUpdateDestroyAPIView):
+    queryset = Post.objects.all()
+
+    @conditional
+    def get(self, request, pk):
+        return super().get(request, pk=pk)
+
+    def retrieve(self, request, pk):
+        data = cache.get_or_build(
+            Post, pk, PostDetailSerializer,
+            lambda: self.get_serializer(self.get_object()).data,
+            **self.get_selection()
+        )
+        return Response(data)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            counters.post_deleted(instance)
 
-class MeetingIndexAPIView(GenericAPIView):
+
+class MeetingIndexViewMixin(NestedIndexViewMixin):
     serializer_class = MeetingIndexSerializer
+    parent_field = 'group_id'
+
+    def get_state(self, request, group_id):
+        return [state(self.get_queryset(), 'creator', 'group', 'group__creator')]
+
 
+class MeetingIndexAPIView(MeetingIndexViewMixin, GenericAPIView):
+    @conditional
     def get(self, request, group_id):
-        group = find_or_404(Group, group_id)
-        meetings = group.meetings.all() #one to many
-        return paginate(request, meetings, MeetingIndexSerializer)
+        find_or_404(Group, group_id)
+        return paginate(request, self.get_queryset(), MeetingIndexSerializer, KeysetPagination)
 
     def post(self, request, group_id):
         group = find_or_404(Group, group_id)
@@ -209,61 +554,137 @@ class MeetingIndexAPIView(GenericAPIView):
             group=group,
             creator=request.user
         )
-        meeting.save()
+        with transaction.atomic():
+            meeting.save()
+            counters.meeting_created(meeting)
+
         serializer = MeetingIndexSerializer(meeting)
         return Response(serializer.data)
 
 
-class MeetingDetailAPIView(RetrieveUpdateDestroyAPIView):
-    queryset = Meeting.objects.all()
+class MeetingDetailViewMixin:
     serializer_class = MeetingDetailSerializer
+    throttle_cost = {'GET': 5}  # all of the meeting's attendees
 
+    def get_state(self, request, pk):
+        return [
+            state(Meeting.objects.filter(id=pk), 'creator', 'group', 'group__creator'),
+            state(Meeting.attendees.through.objects.filter(meeting_id=pk)),
+            state(User.objects.filter(attending_meetings=pk))
+        ]
 
-class MeetingAttendAPIView(GenericAPIView):
-    serializer_class = MeetingDetailSerializer
 
-    def post(self, request, meeting_id):
-        meeting = find_or_404(Meeting, meeting_id)
-        already_attending = meeting.attendees.filter(id=request.user.id).first()
+class MeetingDetailAPIView(MeetingDetailViewMixin, EagerLoadingViewMixin, RetrieveUpdateDestroyAPIView):
+    queryset = Meeting.objects.all()
+
+    @conditional
+    def get(self, request, pk):
+        return super().get(request, pk=pk)
+
+    def perform_update(self, serializer):
+        old_time = serializer.instance.time
+        with transaction.atomic():
+            meeting = serializer.save()
+            counters.meeting_rescheduled(meeting, old_time)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            counters.meeting_deleted(instance)
 
-        if already_attending:
+
+class UpcomingMeetingIndexAPIView(GenericAPIView):
+    serializer_class = MeetingUpcomingSerializer
+
+    def get(self, request):
+        city = request.query_params.get('city') or request.user.address_city
+        if not city:
             return Response({
                 'success': False,
-                'message': 'You are already attending this meeting'
+                'error': 'city is required'
             })
-        
-        meeting.attendees.add(request.user)
-        meeting.save()
+
+        try:
+            start, end = discovery.get_window(request.query_params.get('from'), request.query_params.get('to'))
+        except ValidationError as error:
+            return Response({
+                'success': False,
+                'error': error.messages
+            })
+
+        rows = discovery.get_cached(city, start, end)
+        if rows is None:
+            meetings = discovery.upcoming(city, start, end)
+            return paginate(request, meetings, MeetingUpcomingSerializer, discovery.UpcomingPagination)
+
+        paginator = discovery.UpcomingPagination()
+        page = paginator.paginate_queryset(rows, request=request)
+        results = discovery.with_attendee_counts(page)
+        fields = get_selection(request, MeetingUpcomingSerializer).get('fields')
+        if fields is not None:
+            results = [{name: value for name, value in result.items() if name in fields} for result in results]
+
+        return paginator.get_paginated_response(results)
+
+
+def attendance_response(request, meeting_id, result, attending, message):
+    if result is None:
+        raise Http404
+
+    changed, attendee_count = result
+    if changed and request.query_params.get('detail') == 'true':
+        meeting = find_or_404(Meeting, meeting_id, MeetingDetailSerializer)
         serializer = MeetingDetailSerializer(meeting)
         return Response(serializer.data)
 
+    response = {
+        'success': changed,
+        'attending': attending,
+        'attendee_count': attendee_count
+    }
+    if not changed:
+        response['message'] = message
 
-class MeetingUnattendAPIView(GenericAPIView):
+    return Response(response)
+
+
+class MeetingAttendAPIView(GenericAPIView):
     serializer_class = MeetingDetailSerializer
 
     def post(self, request, meeting_id):
-        meeting = find_or_404(Meeting, meeting_id)
-        already_attending = meeting.attendees.filter(id=request.user.id).first()
+        result = attendance.attend(meeting_id, request.user.id)
+        cache.invalidate((User, request.user.id))
+        return attendance_response(
+            request, meeting_id, result, True,
+            'You are already attending this meeting'
+        )
 
-        if not already_attending:
-            return Response({
-                'success': False,
-                'message': 'You are already not attending this meeting'
-            })
-        
-        meeting.attendees.remove(request.user)
-        meeting.save()
-        serializer = MeetingDetailSerializer(meeting)
-        return Response(serializer.data)
+
+class MeetingUnattendAPIView(GenericAPIView):
+    serializer_class = MeetingDetailSerializer
+
+    def post(self, request, meeting_id):
+        result = attendance.unattend(meeting_id, request.user.id)
+        cache.invalidate((User, request.user.id))
+        return attendance_response(
+            request, meeting_id, result, False,
+            'You are already not attending this meeting'
+        )
 
 
-class CommentIndexAPIView(GenericAPIView):
+class CommentIndexViewMixin(NestedIndexViewMixin):
     serializer_class = CommentIndexSerializer
+    parent_field = 'post_id'
+
+    def get_state(self, request, post_id):
+        return [state(self.get_queryset(), 'user', 'post', 'post__user')]
 
+
+class CommentIndexAPIView(CommentIndexViewMixin, GenericAPIView):
+    @conditional
     def get(self, request, post_id):
-        post = find_or_404(Post, post_id)
-        comments = post.comments.all() #one to many
-        return paginate(request, comments, CommentIndexSerializer)
+        find_or_404(Post, post_id)
+        return paginate(request, self.get_queryset(), CommentIndexSerializer, KeysetPagination)
 
     def post(self, request, post_id):
         post = find_or_404(Post, post_id)
@@ -279,18 +700,58 @@ class CommentIndexAPIView(GenericAPIView):
         return Response(serializer.data)
     
 
-class CommentDetailAPIView(RetrieveUpdateDestroyAPIView):
-    queryset = Comment.objects.all()
+class CommentBatchAPIView(GenericAPIView):
+    serializer_class = CommentIndexSerializer
+
+    def post(self, request):
+        posts = resolve_ids(request.data if isinstance(request.data, list) else [], 'post', Post)
+
+        def build(item):
+            post = posts.get(parse_id(item['post']))
+            if post is None:
+                raise ValidationError({'post': f'Post {item["post"]} does not exist'})
+
+            return Comment(
+                text=item['text'],
+                rating=item['rating'],
+                post=post,
+                user=request.user
+            )
+
+        def created(comments):
+            cache.invalidate(*{(Post, comment.post_id) for comment in comments})
+
+        return create_batch(request, Comment, CommentIndexSerializer, ('post', 'text', 'rating'), build, created)
+
+
+class CommentDetailViewMixin:
     serializer_class = CommentDetailSerializer
 
+    def get_state(self, request, pk):
+        return [state(Comment.objects.filter(id=pk), 'user', 'post', 'post__user')]
+
+
+class CommentDetailAPIView(CommentDetailViewMixin, EagerLoadingViewMixin, RetrieveUpdateDestroyAPIView):
+    queryset = Comment.objects.all()
+
+    @conditional(last_modified=True)
+    def get(self, request, pk):
+        return super().get(request, pk=pk)
 
-class AnimalIndexAPIView(GenericAPIView):
+
+class AnimalIndexViewMixin(NestedIndexViewMixin):
     serializer_class = AnimalIndexSerializer
+    parent_field = 'user_id'
+
+    def get_state(self, request, user_id):
+        return [state(self.get_queryset(), 'user')]
+
 
+class AnimalIndexAPIView(AnimalIndexViewMixin, GenericAPIView):
+    @conditional
     def get(self, request, user_id):
-        user = find_or_404(User, user_id)
-        animals = user.animals.all() #one to many
-        return paginate(request, animals, AnimalIndexSerializer)
+        find_or_404(User, user_id)
+        return paginate(request, self.get_queryset(), AnimalIndexSerializer, KeysetPagination)
 
 
 class AnimalCreateAPIView(GenericAPIView):
@@ -308,6 +769,84 @@ class AnimalCreateAPIView(GenericAPIView):
         return Response(serializer.data)
     
 
-class AnimalDetailAPIView(RetrieveUpdateDestroyAPIView):
+class AnimalBatchAPIView(GenericAPIView):
+    serializer_class = AnimalDetailSerializer
+
+    def post(self, request):
+        def build(item):
+            return Animal(
+                name=item['name'],
+                type=item['type'],
+                breed=item['breed'],
+                user=request.user
+            )
+
+        def created(animals):
+            cache.invalidate((User, request.user.id))
+
+        return create_batch(request, Animal, AnimalDetailSerializer, ('name', 'type', 'breed'), build, created)
+
+
+class AnimalDetailViewMixin:
+    serializer_class = AnimalDetailSerializer
+
+    def get_state(self, request, pk):
+        return [state(Animal.objects.filter(id=pk), 'user')]
+
+
+class AnimalDetailAPIView(AnimalDetailViewMixin, EagerLoadingViewMixin, RetrieveUpdateDestroyAPIView):
     queryset = Animal.objects.all()
-    serializer_class = AnimalDetailSerializer
\ No newline at end of file
+
+    @conditional(last_modified=True)
+    def get(self, request, pk):
+        return super().get(request, pk=pk)
+
+
+class FeedAPIView(APIView):
+    def get(self, request):
+        paginator = feed.FeedPagination()
+        rows = paginator.paginate_queryset(request.user.id, request=request)
+        return paginator.get_paginated_response(feed.load_items(rows))
+
+
+class SearchAPIView(APIView):
+    def get(self, request):
+        text = request.query_params.get('q', '')
+        if not search.get_terms(text):
+            return Response({
+                'success': False,
+                'error': 'Nothing to search for'
+            })
+
+        kinds = request.query_params.get('type')
+        kinds = kinds.split(',') if kinds else None
+        if kinds and not set(kinds) <= set(search.SEARCHED):
+            return Response({
+                'success': False,
+                'error': f'type must be one of {", ".join(search.SEARCHED)}'
+            })
+
+        paginator = search.SearchPagination()
+        rows = paginator.paginate_queryset(search.search(text, kinds), request=request)
+        return paginator.get_paginated_response(search.load_results(rows))
+
+
+class ResponseCacheStatsAPIView(APIView):
+    permission_classes = (IsSuperUser,)
+
+    def get(self, request):
+        return Response(cache.get_stats())
+
+
+class InstrumentationStatsAPIView(APIView):
+    permission_classes = (IsSuperUser,)
+
+    def get(self, request):
+        return Response(instrumentation.get_stats())
+
+
+class DatabaseStatsAPIView(APIView):
+    permission_classes = (IsSuperUser,)
+
+    def get(self, request):
+        return Response(database.get_stats())